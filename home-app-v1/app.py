@@ -1,123 +1,215 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory
-from flask_session import Session
+from flask import Flask, Response, render_template, request, redirect, url_for, session, flash, send_from_directory, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 import sqlite3
 import os
+import click
 from datetime import datetime, timedelta
 import json
 import logging
 
+import assets
+import avatars
+import db as database
+import events
+import maintenance
+import migrations
+import perf
+from cache import TTLCache
+from db import get_db, write_transaction
+from sessions import SQLiteSessionInterface
+
 app = Flask(__name__)
 app.secret_key = 'super_secret_key'  # Change in production
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['UPLOAD_FOLDER'] = os.path.join('static', 'uploads')
-Session(app)
+# Session storage: 'sqlite' (sessions table in home.db), 'cookie' (Flask's signed cookie)
+# or 'filesystem' (Flask-Session files under ./flask_session)
+app.config['SESSION_BACKEND'] = os.environ.get('HOME_APP_SESSION_BACKEND', 'sqlite')
+app.config['SESSION_PRUNE_INTERVAL'] = 600  # seconds between deletes of expired sqlite sessions
+app.config['UPLOAD_FOLDER'] = os.environ.get('HOME_APP_UPLOAD_FOLDER', os.path.join(app.root_path, 'static', 'uploads'))
+app.config['DATABASE'] = os.environ.get('HOME_APP_DATABASE', os.path.join(app.root_path, 'home.db'))
+app.config['DB_POOL_SIZE'] = int(os.environ.get('HOME_APP_DB_POOL_SIZE', 5))
+app.config['DB_POOL_TIMEOUT'] = 10.0  # seconds to wait for a free pooled connection
+app.config['DB_BUSY_TIMEOUT_MS'] = 5000  # how long SQLite retries a locked database
+# Task instances older than this move to the archive database (flask archive); daily_stats keeps their counts
+app.config['ARCHIVE_DATABASE'] = os.environ.get('HOME_APP_ARCHIVE_DATABASE', os.path.join(app.root_path, 'home-archive.db'))
+app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('HOME_APP_ARCHIVE_AFTER_DAYS', 730))
+# Live updates (/events): how often each process checks for changes made by other workers,
+# and how many streams it holds open. gunicorn.conf.py lowers the cap under its gthread
+# worker, where each stream holds a worker thread.
+app.config['EVENTS_POLL_INTERVAL'] = 1.0  # seconds
+app.config['EVENTS_RETENTION'] = 600  # seconds a change stays available to reconnecting streams
+app.config['EVENTS_MAX_STREAMS'] = int(os.environ.get('HOME_APP_EVENTS_MAX_STREAMS', 500))
+app.config['CACHE_MAXSIZE'] = 256
+app.config['CACHE_TTL'] = float(os.environ.get('HOME_APP_CACHE_TTL', 60))  # seconds before an entry is reloaded anyway
+# Opt-in request profiling: Server-Timing headers, per-endpoint percentiles at /debug/perf,
+# N+1 warnings and sampled cProfile dumps of slow requests (see perf.py)
+app.config['PERF_ENABLED'] = os.environ.get('HOME_APP_PERF', '0') == '1'
+app.config['PERF_WINDOW'] = 1000  # requests per endpoint kept for the percentiles
+app.config['PERF_N_PLUS_ONE'] = 10  # same statement this many times in one request is logged as N+1
+app.config['PERF_PROFILE_SAMPLE'] = float(os.environ.get('HOME_APP_PERF_PROFILE_SAMPLE', 0))  # fraction of requests
+app.config['PERF_PROFILE_THRESHOLD_MS'] = float(os.environ.get('HOME_APP_PERF_PROFILE_THRESHOLD_MS', 500))
+app.config['PERF_PROFILE_DIR'] = os.environ.get('HOME_APP_PERF_PROFILE_DIR', os.path.join(app.root_path, 'profiles'))
+database.init_app(app)
+if app.config['PERF_ENABLED']:
+    perf.init_app(app)
+if app.config['SESSION_BACKEND'] == 'sqlite':
+    app.session_interface = SQLiteSessionInterface(prune_interval=app.config['SESSION_PRUNE_INTERVAL'])
+elif app.config['SESSION_BACKEND'] == 'filesystem':
+    from flask_session import Session
+    app.config['SESSION_TYPE'] = 'filesystem'
+    Session(app)
+
+# Templates and landing star counts change rarely. Both are keyed by broadcaster.version() of the
+# change events that affect them, which writes in every worker move forward, so no worker serves
+# them stale. Done toggles publish only 'instances' events and leave both caches alone.
+cache = TTLCache(maxsize=app.config['CACHE_MAXSIZE'], ttl=app.config['CACHE_TTL'])
 
-# Setup logging
-logging.basicConfig(level=logging.DEBUG)
+broadcaster = events.ChangeBroadcaster(poll_interval=app.config['EVENTS_POLL_INTERVAL'],
+                                      retention=app.config['EVENTS_RETENTION'],
+                                      max_streams=app.config['EVENTS_MAX_STREAMS'])
+
+# Setup logging (HOME_APP_LOG_LEVEL=DEBUG to trace requests; the hot paths log lazily)
+logging.basicConfig(level=os.environ.get('HOME_APP_LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
 logger = logging.getLogger(__name__)
 
 # Ensure upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# Database connection
-def get_db():
-    conn = sqlite3.connect('home.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+# Fingerprinted, precompressed static files (rebuilt here when static/ changes, see assets.py)
+assets.init_app(app)
 
 # Init DB
 def init_db():
     with get_db() as db:
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                type TEXT NOT NULL,  -- 'parent' or 'kid'
-                passcode TEXT NOT NULL,
-                profile_pic TEXT
-            )
-        ''')
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS task_templates (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                category TEXT NOT NULL,  -- 'morning', 'evening', 'night'
-                order_num INTEGER DEFAULT 0
-            )
-        ''')
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS task_instances (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                task_template_id INTEGER,
-                user_id INTEGER,
-                date TEXT NOT NULL,  -- YYYY-MM-DD
-                done INTEGER DEFAULT 0,
-                starred INTEGER DEFAULT 0,
-                FOREIGN KEY(task_template_id) REFERENCES task_templates(id) ON DELETE CASCADE,
-                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        ''')
+        migrations.migrate(db)
         # Add default parent user for testing if none exist (no hardcoded tasks)
         cursor = db.execute('SELECT COUNT(*) FROM users')
         if cursor.fetchone()[0] == 0:
             hashed = generate_password_hash('1234')
             db.execute('INSERT INTO users (name, type, passcode, profile_pic) VALUES (?, ?, ?, ?)',
                        ('Test Parent', 'parent', hashed, 'default.png'))
-        # Add order_num column if not exists
-        try:
-            db.execute('ALTER TABLE task_templates ADD COLUMN order_num INTEGER DEFAULT 0')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
         db.commit()
 
-init_db()
+# Helper: Save an uploaded profile picture as avatar thumbnails; returns the filename or None
+def save_profile_pic(file):
+    try:
+        return avatars.save_avatar(file.read(), app.config['UPLOAD_FOLDER'])
+    except ValueError:
+        logger.warning('Rejected profile picture upload %r', file.filename)
+        return None
 
-# Helper: Get task instance or create
-def get_or_create_task_instance(task_id, user_id, date):
-    with get_db() as db:
-        instance = db.execute('SELECT * FROM task_instances WHERE task_template_id = ? AND user_id = ? AND date = ?',
-                              (task_id, user_id, date)).fetchone()
-        if not instance:
-            db.execute('INSERT INTO task_instances (task_template_id, user_id, date) VALUES (?, ?, ?)',
-                       (task_id, user_id, date))
-            db.commit()
-            instance = db.execute('SELECT * FROM task_instances WHERE task_template_id = ? AND user_id = ? AND date = ?',
-                                  (task_id, user_id, date)).fetchone()
-        return instance
+@app.template_global()
+def avatar_url(profile_pic, size, ext='jpg'):
+    if avatars.is_avatar(profile_pic):
+        return url_for('uploads', filename=avatars.variant(profile_pic, size, ext))
+    if not profile_pic or profile_pic == avatars.DEFAULT_PIC:
+        return url_for('static', filename=avatars.default_filename(size, ext))
+    return url_for('uploads', filename=profile_pic)  # Not yet converted by backfill-avatars
+
+@app.template_global()
+def has_avatar_variants(profile_pic):
+    return avatars.is_avatar(profile_pic) or not profile_pic or profile_pic == avatars.DEFAULT_PIC
+
+# Helper: The days a kid may still change (today and yesterday)
+def kid_editable_dates():
+    now = datetime.now()
+    return now.strftime('%Y-%m-%d'), (now - timedelta(days=1)).strftime('%Y-%m-%d')
+
+# Helper: Whether a user still exists (a session can outlive a deleted kid)
+def user_exists(db, user_id):
+    return db.execute('SELECT 1 FROM users WHERE id = ?', (user_id,)).fetchone() is not None
+
+# Helper: All current task templates in display order (cached)
+def load_templates(db):
+    return cache.get_or_load(('task_templates', broadcaster.version(db, 'templates')), lambda: db.execute(
+        'SELECT * FROM task_templates WHERE deleted_at IS NULL ORDER BY category, order_num').fetchall())
+
+def archive_cutoff(after_days=None):
+    """Dates before this (YYYY-MM-DD) are archived; their instances are no longer in task_instances."""
+    if after_days is None:
+        after_days = app.config['ARCHIVE_AFTER_DAYS']
+    return (datetime.now() - timedelta(days=after_days)).strftime('%Y-%m-%d')
+
+# Helper: The last date whose task instances are created on demand: tomorrow, as far as `flask materialize` goes
+def materialize_horizon():
+    return (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+
+# Helper: Load a kid's task instances for a day, creating any missing ones in one statement.
+# Archived days stay as they are rather than coming back as fresh, undone rows. Days after
+# the horizon are shown from the templates (instances with id None) without writing anything.
+def materialize_day(db, user_id, date, templates):
+    query = 'SELECT * FROM task_instances WHERE user_id = ? AND date = ?'
+    instances = {row['task_template_id']: row for row in db.execute(query, (user_id, date))}
+    if all(t['id'] in instances for t in templates):
+        return instances
+    if date > materialize_horizon():
+        for t in templates:
+            instances.setdefault(t['id'], {'id': None, 'task_template_id': t['id'], 'user_id': user_id,
+                                           'date': date, 'done': 0, 'starred': 0})
+    elif date >= archive_cutoff():
+        # OR IGNORE + the unique index lets concurrent requests race without creating duplicates
+        db.execute('''
+            INSERT OR IGNORE INTO task_instances (task_template_id, user_id, date)
+            SELECT id, ?, ? FROM task_templates WHERE deleted_at IS NULL
+        ''', (user_id, date))
+        db.commit()
+        instances = {row['task_template_id']: row for row in db.execute(query, (user_id, date))}
+    return instances
+
+# Landing page: every user plus each one's star counts, in a single statement.
+# The counts come from the daily_stats rollup, so a year is at most 366 rows per kid.
+STAR_TOTALS = '''
+           (SELECT COALESCE(SUM(starred_count), 0) FROM daily_stats
+            WHERE user_id = u.id AND date BETWEEN :year_start AND :year_end) AS stars_year,
+           (SELECT COALESCE(SUM(starred_count), 0) FROM daily_stats
+            WHERE user_id = u.id AND date BETWEEN :month_start AND :month_end) AS stars_month,
+           (SELECT COALESCE(SUM(starred_count), 0) FROM daily_stats
+            WHERE user_id = u.id AND date IN (:yesterday, :today)) AS stars_last_two_days
+'''
+LANDING_QUERY = f'SELECT u.*, {STAR_TOTALS} FROM users u ORDER BY u.id'
+USER_STAR_TOTALS_QUERY = f'SELECT {STAR_TOTALS} FROM users u WHERE u.id = :user_id'
+
+def landing_params(today):
+    next_month = today.replace(day=1) + timedelta(days=32)
+    return {
+        'year_start': today.strftime('%Y-01-01'),
+        'year_end': today.strftime('%Y-12-31'),
+        'month_start': today.strftime('%Y-%m-01'),
+        'month_end': (next_month.replace(day=1) - timedelta(days=1)).strftime('%Y-%m-%d'),
+        'yesterday': (today - timedelta(days=1)).strftime('%Y-%m-%d'),
+        'today': today.strftime('%Y-%m-%d'),
+    }
+
+# Push changed instances (and, when stars changed, the kid's new landing totals) to open
+# dashboards. Runs inside the caller's write transaction; call broadcaster.notify() after commit.
+def publish_changes(db, rows, stars_changed):
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row['user_id'], []).append(row)
+    for user_id, user_rows in by_user.items():
+        broadcaster.publish(db, user_id, 'instances', {
+            'user_id': user_id,
+            'instances': [{'id': r['id'], 'date': r['date'], 'done': bool(r['done']), 'starred': bool(r['starred'])}
+                          for r in user_rows],
+        })
+        if stars_changed:
+            totals = db.execute(USER_STAR_TOTALS_QUERY, {**landing_params(datetime.now()), 'user_id': user_id}).fetchone()
+            broadcaster.publish(db, user_id, 'stars', {'user_id': user_id, **dict(totals)})
 
-# Landing page
 @app.route('/', methods=['GET'])
 def landing():
+    today = datetime.now()
+    
+    def load():
+        with get_db() as db:
+            users = db.execute(LANDING_QUERY, landing_params(today)).fetchall()
+        kids_list = [dict(user) for user in users if user['type'] == 'kid']
+        parents_list = [dict(user) for user in users if user['type'] == 'parent']
+        return kids_list, parents_list
+    
     with get_db() as db:
-        kids = db.execute("SELECT * FROM users WHERE type = 'kid'").fetchall()
-        parents = db.execute("SELECT * FROM users WHERE type = 'parent'").fetchall()
-        
-        today_str = datetime.now().strftime('%Y-%m-%d')
-        yesterday_str = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-        kids_list = []
-        for kid in kids:
-            kid_dict = dict(kid)
-            today = datetime.now()
-            year_start = today.replace(day=1).replace(month=1).strftime('%Y-%m-%d')
-            year_end = today.replace(day=31).replace(month=12).strftime('%Y-%m-%d')
-            stars_year = db.execute('SELECT COUNT(*) FROM task_instances WHERE user_id = ? AND starred = 1 AND date BETWEEN ? AND ?',
-                                    (kid['id'], year_start, year_end)).fetchone()[0]
-            month_start = today.replace(day=1).strftime('%Y-%m-%d')
-            next_month = today.replace(day=1) + timedelta(days=32)
-            month_end = (next_month.replace(day=1) - timedelta(days=1)).strftime('%Y-%m-%d')
-            stars_month = db.execute('SELECT COUNT(*) FROM task_instances WHERE user_id = ? AND starred = 1 AND date BETWEEN ? AND ?',
-                                    (kid['id'], month_start, month_end)).fetchone()[0]
-            stars_last_two_days = db.execute('SELECT COUNT(*) FROM task_instances WHERE user_id = ? AND starred = 1 AND date IN (?, ?)',
-                                            (kid['id'], yesterday_str, today_str)).fetchone()[0]
-            kid_dict['stars_year'] = stars_year
-            kid_dict['stars_month'] = stars_month
-            kid_dict['stars_last_two_days'] = stars_last_two_days
-            kids_list.append(kid_dict)
-        
-        parents_list = [dict(parent) for parent in parents]
-        
+        version = broadcaster.version(db, 'stars', 'users')
+    kids_list, parents_list = cache.get_or_load(('landing', today.strftime('%Y-%m-%d'), version), load)
     return render_template('landing.html', kids=kids_list, parents=parents_list)
 
 # Login
@@ -130,7 +222,7 @@ def login(user_id):
             if user and check_password_hash(user['passcode'], passcode):
                 session['user_id'] = user['id']
                 session['type'] = user['type']
-                logger.debug(f"User {user['name']} logged in. Session: {session}")
+                logger.debug("User %s logged in. Session: %s", user['name'], session)
                 if user['type'] == 'kid':
                     session['view_user_id'] = user['id']
                     return redirect(url_for('home'))
@@ -144,7 +236,7 @@ def login(user_id):
 @app.route('/kids')
 def kids():
     if 'user_id' not in session or session['type'] != 'parent':
-        logger.debug(f"Access to /kids denied. Session: {session}")
+        logger.debug("Access to /kids denied. Session: %s", session)
         return redirect(url_for('landing'))
     with get_db() as db:
         kids = db.execute("SELECT * FROM users WHERE type = 'kid'").fetchall()
@@ -153,10 +245,14 @@ def kids():
 @app.route('/set_view/<int:kid_id>')
 def set_view(kid_id):
     if 'user_id' not in session or session['type'] != 'parent':
-        logger.debug(f"Access to /set_view denied. Session: {session}")
+        logger.debug("Access to /set_view denied. Session: %s", session)
         return redirect(url_for('landing'))
+    with get_db() as db:
+        if not user_exists(db, kid_id):
+            flash('That kid no longer exists.')
+            return redirect(url_for('kids'))
     session['view_user_id'] = kid_id
-    logger.debug(f"Set view_user_id to {kid_id}. Session: {session}")
+    logger.debug("Set view_user_id to %s. Session: %s", kid_id, session)
     return redirect(url_for('home'))
 
 # Home page
@@ -170,13 +266,13 @@ def home():
         logger.debug("Redirecting to /kids: No view_user_id for parent")
         return redirect(url_for('kids'))
     
-    today_str = datetime.now().strftime('%Y-%m-%d')
-    yesterday_str = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    today_str, yesterday_str = kid_editable_dates()
     tomorrow_str = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
     
     date = request.args.get('date', today_str)
     try:
         date_obj = datetime.strptime(date, '%Y-%m-%d')
+        date = date_obj.strftime('%Y-%m-%d')  # strptime also takes 2024-1-5; rows are keyed by the padded form
     except:
         date = today_str
         date_obj = datetime.now()
@@ -193,52 +289,177 @@ def home():
     is_kid = session['type'] == 'kid'
     is_editable = True
     if is_kid:
-        is_editable = date in [today_str, yesterday_str]
+        is_editable = date in kid_editable_dates()
+    elif date > tomorrow_str:
+        is_editable = False  # Not materialized yet (see materialize_day)
     
     with get_db() as db:
-        templates = db.execute('SELECT * FROM task_templates ORDER BY category, order_num').fetchall()
+        if not user_exists(db, view_user_id):
+            logger.debug("view_user_id %s no longer exists", view_user_id)
+            session.pop('view_user_id', None)
+            if is_parent:
+                flash('That kid no longer exists.')
+                return redirect(url_for('kids'))
+            session.clear()
+            return redirect(url_for('landing'))
+        
+        # Writes don't need the page, so handle them before materializing the day
+        if request.method == 'POST':
+            action = request.form.get('action')
+            if action is None:
+                flash('Invalid action.')
+                return redirect(url_for('home', date=date))
+            changed = []
+            instance_id = request.form.get('instance_id')
+            if action == 'toggle_done' and (is_parent or is_editable) and instance_id:
+                db.execute('UPDATE task_instances SET done = NOT done WHERE id = ?', (instance_id,))
+                changed = db.execute('SELECT * FROM task_instances WHERE id = ?', (instance_id,)).fetchall()
+            elif action == 'toggle_star' and is_parent and instance_id:
+                db.execute('UPDATE task_instances SET starred = NOT starred WHERE id = ?', (instance_id,))
+                changed = db.execute('SELECT * FROM task_instances WHERE id = ?', (instance_id,)).fetchall()
+            elif action == 'star_all' and is_parent:
+                if db.execute('UPDATE task_instances SET starred = 1 WHERE user_id = ? AND date = ? AND done = 1 AND starred = 0',
+                              (view_user_id, date)).rowcount:
+                    changed = db.execute('SELECT * FROM task_instances WHERE user_id = ? AND date = ? AND starred = 1',
+                                         (view_user_id, date)).fetchall()
+            publish_changes(db, changed, stars_changed=action != 'toggle_done')
+            db.commit()
+            if changed:
+                broadcaster.notify()
+            logger.debug("Action %s performed", action)
+            return redirect(url_for('home', date=date))
+        
+        templates = load_templates(db)
         if not templates:
             logger.debug("No task templates found in database")
             return render_template('home.html', date=date, prev_date=prev_date, next_date=next_date,
                                    current_display=current_display, prev_display=prev_display, next_display=next_display,
                                    categories={}, is_parent=is_parent, is_editable=is_editable, no_data=True)
-    
-    categories = {'morning': [], 'evening': [], 'night': []}
-    for t in templates:
-        instance = get_or_create_task_instance(t['id'], view_user_id, date)
-        categories[t['category']].append({
-            'template': t,
-            'instance': instance
-        })
-    
-    if request.method == 'POST':
-        action = request.form.get('action')
-        if action is None:
-            flash('Invalid action.')
-            return redirect(url_for('home', date=date))
-        with get_db() as db:
-            if action == 'toggle_done' and (is_parent or is_editable):
-                instance_id = request.form.get('instance_id')
-                if instance_id:
-                    db.execute('UPDATE task_instances SET done = NOT done WHERE id = ?', (instance_id,))
-            elif action == 'toggle_star' and is_parent:
-                instance_id = request.form.get('instance_id')
-                if instance_id:
-                    db.execute('UPDATE task_instances SET starred = NOT starred WHERE id = ?', (instance_id,))
-            elif action == 'star_all' and is_parent:
-                for cat in categories.values():
-                    for task in cat:
-                        if task['instance']['done']:
-                            db.execute('UPDATE task_instances SET starred = 1 WHERE id = ?', (task['instance']['id'],))
-            db.commit()
-        logger.debug(f"Action {action} performed")
-        return redirect(url_for('home', date=date))
+        
+        instances = materialize_day(db, view_user_id, date, templates)
+        categories = {'morning': [], 'evening': [], 'night': []}
+        for t in templates:
+            # A cached template may have been deleted by another worker since it was loaded
+            if t['id'] in instances:
+                categories[t['category']].append({
+                    'template': t,
+                    'instance': instances[t['id']]
+                })
     
     return render_template('home.html', date=date, prev_date=prev_date, next_date=next_date,
                           current_display=current_display, prev_display=prev_display, next_display=next_display,
                           categories=categories, is_parent=is_parent, is_editable=is_editable, no_data=False)
 
-# History
+# JSON API used by home.html to update tasks in place.
+# Same rules as home(): kids may only change their own done flags for today and
+# yesterday; only parents may change stars.
+API_MAX_BATCH = 200
+
+def api_error(message, status):
+    return jsonify(error=message), status
+
+def instance_json(row):
+    return {'id': row['id'], 'task_template_id': row['task_template_id'], 'user_id': row['user_id'],
+            'date': row['date'], 'done': bool(row['done']), 'starred': bool(row['starred'])}
+
+@app.route('/api/users/<int:user_id>/days/<date>', methods=['GET'])
+def api_day(user_id, date):
+    if 'user_id' not in session:
+        return api_error('Not logged in.', 401)
+    is_parent = session['type'] == 'parent'
+    if not is_parent and user_id != session['user_id']:
+        return api_error('Kids can only see their own tasks.', 403)
+    try:
+        date = datetime.strptime(date, '%Y-%m-%d').strftime('%Y-%m-%d')  # 2024-1-5 -> 2024-01-05
+    except ValueError:
+        return api_error('Date must be YYYY-MM-DD.', 400)
+    
+    with get_db() as db:
+        if not user_exists(db, user_id):
+            return api_error('Unknown user.', 404)
+        templates = load_templates(db)
+        instances = materialize_day(db, user_id, date, templates)
+    tasks = []
+    for t in templates:
+        if t['id'] in instances:
+            task = instance_json(instances[t['id']])
+            task.update(name=t['name'], category=t['category'], order_num=t['order_num'])
+            tasks.append(task)
+    editable = date in kid_editable_dates() or (is_parent and date <= materialize_horizon())
+    return jsonify(user_id=user_id, date=date, editable=editable, tasks=tasks)
+
+@app.route('/api/instances', methods=['PATCH'])
+def api_update_instances():
+    """Apply a batch of {id, done?, starred?} changes atomically and return the rows that changed."""
+    if 'user_id' not in session:
+        return api_error('Not logged in.', 401)
+    is_parent = session['type'] == 'parent'
+    payload = request.get_json(silent=True)
+    changes = payload.get('changes') if isinstance(payload, dict) else None
+    if not isinstance(changes, list) or not 0 < len(changes) <= API_MAX_BATCH:
+        return api_error(f'Expected {{"changes": [...]}} with 1 to {API_MAX_BATCH} entries.', 400)
+    
+    wanted = {}
+    for change in changes:
+        if not isinstance(change, dict) or type(change.get('id')) is not int:
+            return api_error('Each change needs an integer id.', 400)
+        fields = {k: v for k, v in change.items() if k in ('done', 'starred')}
+        if not fields or not all(isinstance(v, bool) for v in fields.values()):
+            return api_error('Each change needs a boolean done and/or starred.', 400)
+        if 'starred' in fields and not is_parent:
+            return api_error('Only parents can change stars.', 403)
+        wanted.setdefault(change['id'], {}).update(fields)
+    
+    ids = list(wanted)
+    with write_transaction(get_db()) as db:
+        rows = db.execute(f'SELECT * FROM task_instances WHERE id IN ({", ".join("?" * len(ids))})', ids).fetchall()
+        if len(rows) != len(ids):
+            return api_error('Unknown task instance.', 404)
+        if not is_parent:
+            editable = kid_editable_dates()
+            if any(row['user_id'] != session['user_id'] or row['date'] not in editable for row in rows):
+                return api_error('That day can no longer be changed.', 403)
+        
+        changed = []
+        stars_changed = False
+        for row in rows:
+            new = {field: int(wanted[row['id']].get(field, bool(row[field]))) for field in ('done', 'starred')}
+            if new['done'] != row['done'] or new['starred'] != row['starred']:
+                changed.append(dict(row, **new))
+                stars_changed = stars_changed or new['starred'] != row['starred']
+        db.executemany('UPDATE task_instances SET done = ?, starred = ? WHERE id = ?',
+                       [(c['done'], c['starred'], c['id']) for c in changed])
+        publish_changes(db, changed, stars_changed)
+    
+    if changed:
+        broadcaster.notify()
+    logger.debug("API updated %d of %d instances", len(changed), len(ids))
+    return jsonify(instances=[instance_json(c) for c in changed])
+
+# History: star counts for the last 8 full weeks and last 12 calendar months,
+# bucketed from one read of the daily_stats rollup
+HISTORY_QUERY = '''
+    SELECT date, starred_count FROM daily_stats
+    WHERE user_id = ? AND date BETWEEN ? AND ? AND starred_count > 0
+'''
+
+def history_buckets(today):
+    """Return [(label, start, end)] for the weekly and monthly charts, oldest first."""
+    this_monday = (today - timedelta(days=today.weekday())).date()
+    weeks = []
+    for i in range(8, 0, -1):
+        start = this_monday - timedelta(days=7 * i)
+        weeks.append((f'Week {9 - i}', start.isoformat(), (start + timedelta(days=6)).isoformat()))
+    months = []
+    year, month = today.year, today.month
+    for _ in range(12):
+        start = datetime(year, month, 1)
+        end = datetime(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        months.append((start.strftime('%Y-%m'), start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    months.reverse()
+    return weeks, months
+
 @app.route('/history')
 def history():
     if 'user_id' not in session:
@@ -249,38 +470,83 @@ def history():
         logger.debug("Redirecting to /kids: No view_user_id")
         return redirect(url_for('kids'))
     
+    week_buckets, month_buckets = history_buckets(datetime.now())
+    range_start = min(week_buckets[0][1], month_buckets[0][1])
+    range_end = max(week_buckets[-1][2], month_buckets[-1][2])
     with get_db() as db:
-        # Weekly: last 8 weeks
-        weeks = []
-        week_labels = []
-        today = datetime.now()
-        for i in range(8):
-            start = (today - timedelta(days=7*(i+1) + today.weekday())).strftime('%Y-%m-%d')
-            end = (today - timedelta(days=7*i + today.weekday() + 1)).strftime('%Y-%m-%d')
-            count = db.execute('SELECT COUNT(*) FROM task_instances WHERE user_id = ? AND date BETWEEN ? AND ? AND starred = 1',
-                               (view_user_id, start, end)).fetchone()[0]
-            weeks.append(count)
-            week_labels.append(f'Week {8-i}')
-        weeks.reverse()
-        week_labels.reverse()
-        
-        # Monthly: last 12 months
-        months = []
-        month_labels = []
-        for i in range(12):
-            month_start = (today.replace(day=1) - timedelta(days=30*i)).replace(day=1).strftime('%Y-%m-%d')
-            next_month = (today.replace(day=1) - timedelta(days=30*(i-1))) if i > 0 else today + timedelta(days=1)
-            month_end = (next_month.replace(day=1) - timedelta(days=1)).strftime('%Y-%m-%d')
-            count = db.execute('SELECT COUNT(*) FROM task_instances WHERE user_id = ? AND date BETWEEN ? AND ? AND starred = 1',
-                               (view_user_id, month_start, month_end)).fetchone()[0]
-            months.append(count)
-            month_labels.append(month_start[:7])  # YYYY-MM
-        months.reverse()
-        month_labels.reverse()
+        rows = db.execute(HISTORY_QUERY, (view_user_id, range_start, range_end)).fetchall()
+    
+    weeks = [0] * len(week_buckets)
+    months = [0] * len(month_buckets)
+    for row in rows:
+        for i, (_, start, end) in enumerate(week_buckets):
+            if start <= row['date'] <= end:
+                weeks[i] += row['starred_count']
+        for i, (_, start, end) in enumerate(month_buckets):
+            if start <= row['date'] <= end:
+                months[i] += row['starred_count']
+    week_labels = [label for label, _, _ in week_buckets]
+    month_labels = [label for label, _, _ in month_buckets]
     
     return render_template('history.html', week_data=json.dumps(weeks), week_labels=json.dumps(week_labels),
                            month_data=json.dumps(months), month_labels=json.dumps(month_labels))
 
+# Task ordering. Each statement renumbers a whole category 1..n by ROW_NUMBER(),
+# so gaps or duplicate order_nums left by older code or racing edits heal on the next write.
+# Deleted tasks keep their old order_num and are left out.
+RENUMBER_CATEGORY = '''
+    UPDATE task_templates SET order_num = ranked.rn
+    FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY order_num, id) AS rn
+          FROM task_templates WHERE category = :category AND deleted_at IS NULL) AS ranked
+    WHERE task_templates.id = ranked.id AND task_templates.order_num IS NOT ranked.rn
+'''
+
+# Swap a task with its neighbour (:delta = -1 for up, +1 for down); a no-op at either end
+MOVE_TASK = '''
+    WITH ranked AS (
+        SELECT id, ROW_NUMBER() OVER (ORDER BY order_num, id) AS rn
+        FROM task_templates
+        WHERE category = (SELECT category FROM task_templates WHERE id = :id) AND deleted_at IS NULL
+    ),
+    moving AS (
+        SELECT rn FROM ranked WHERE id = :id AND EXISTS (SELECT 1 FROM ranked r WHERE r.rn = ranked.rn + :delta)
+    )
+    UPDATE task_templates SET order_num = CASE
+        WHEN ranked.id = :id AND EXISTS (SELECT 1 FROM moving) THEN ranked.rn + :delta
+        WHEN ranked.rn = (SELECT rn FROM moving) + :delta THEN ranked.rn - :delta
+        ELSE ranked.rn END
+    FROM ranked
+    WHERE task_templates.id = ranked.id
+'''
+
+# Put a category in the order given by the JSON id list :ids. Tasks missing from
+# the list (e.g. added by someone else meanwhile) keep their relative order at the end.
+REORDER_CATEGORY = '''
+    WITH wanted AS (SELECT CAST(value AS INTEGER) AS id, key AS pos FROM json_each(:ids)),
+    ranked AS (
+        SELECT t.id, ROW_NUMBER() OVER (ORDER BY w.pos IS NULL, w.pos, t.order_num, t.id) AS rn
+        FROM task_templates t LEFT JOIN wanted w ON w.id = t.id
+        WHERE t.category = :category AND t.deleted_at IS NULL
+    )
+    UPDATE task_templates SET order_num = ranked.rn
+    FROM ranked
+    WHERE task_templates.id = ranked.id AND task_templates.order_num IS NOT ranked.rn
+'''
+
+# Rows removed per transaction when deleting a kid's history, so other writers get the lock in between
+DELETE_BATCH_SIZE = 5000
+
+def delete_user_history(db, user_id):
+    while True:
+        with write_transaction(db):
+            deleted = db.execute('''
+                DELETE FROM task_instances WHERE id IN (
+                    SELECT id FROM task_instances WHERE user_id = ? LIMIT ?
+                )
+            ''', (user_id, DELETE_BATCH_SIZE)).rowcount
+        if deleted < DELETE_BATCH_SIZE:
+            return
+
 # Settings
 @app.route('/settings', methods=['GET', 'POST'])
 def settings():
@@ -319,9 +585,12 @@ def settings():
                 if 'profile_pic' in request.files:
                     file = request.files['profile_pic']
                     if file.filename:
-                        filename = secure_filename(file.filename)
-                        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                        db.execute('UPDATE users SET passcode = ? WHERE id = ?', (filename, user_id))
+                        filename = save_profile_pic(file)
+                        if filename is None:
+                            flash('Could not read that picture.')
+                            return redirect(url_for('settings'))
+                        db.execute('UPDATE users SET profile_pic = ? WHERE id = ?', (filename, user_id))
+                        broadcaster.publish(db, user_id, 'users', {'user_id': user_id})
                         db.commit()
                     flash('Profile picture updated.')
             elif action == 'add_user' and is_parent:
@@ -334,86 +603,251 @@ def settings():
                     if 'profile_pic' in request.files:
                         file = request.files['profile_pic']
                         if file.filename:
-                            filename = secure_filename(file.filename)
-                            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                            profile_pic = filename
-                    db.execute('INSERT INTO users (name, type, passcode, profile_pic) VALUES (?, ?, ?, ?)',
-                               (name, user_type, hashed, profile_pic))
+                            profile_pic = save_profile_pic(file) or profile_pic
+                    new_id = db.execute('INSERT INTO users (name, type, passcode, profile_pic) VALUES (?, ?, ?, ?)',
+                                        (name, user_type, hashed, profile_pic)).lastrowid
+                    broadcaster.publish(db, new_id, 'users', {'user_id': new_id})
                     db.commit()
                     flash('User added successfully.')
                 else:
                     flash('Invalid input for adding user.')
             elif action == 'delete_user' and is_parent:
-                target_id = request.form.get('target_id')
-                if target_id and int(target_id) != user_id:
-                    # Delete task_instances first (though CASCADE should handle)
-                    db.execute('DELETE FROM task_instances WHERE user_id = ?', (target_id,))
-                    db.execute('DELETE FROM users WHERE id = ?', (target_id,))
-                    db.commit()
-                    flash('User deleted successfully.')
-                else:
+                try:
+                    target_id = int(request.form.get('target_id', ''))
+                except ValueError:
+                    target_id = None
+                if target_id is None:
+                    flash('Invalid user ID.')
+                elif target_id == user_id:
                     flash('Cannot delete your own account.')
+                else:
+                    # Clear years of task_instances in short batches before the user row itself.
+                    # daily_stats rows go with the user row (ON DELETE CASCADE), in the same transaction.
+                    delete_user_history(db, target_id)
+                    with write_transaction(db):
+                        db.execute('DELETE FROM users WHERE id = ?', (target_id,))
+                        broadcaster.publish(db, target_id, 'users', {'user_id': target_id})
+                    flash('User deleted successfully.')
             elif action == 'add_task' and is_parent:
                 name = request.form.get('task_name')
                 category = request.form.get('category')
                 if name and category in ['morning', 'evening', 'night']:
-                    # Set order_num to max +1 in category
-                    max_order = db.execute('SELECT MAX(order_num) FROM task_templates WHERE category = ?', (category,)).fetchone()[0] or 0
-                    order_num = max_order + 1
-                    db.execute('INSERT INTO task_templates (name, category, order_num) VALUES (?, ?, ?)', (name, category, order_num))
+                    # Append at the end of the category
+                    db.execute('''
+                        INSERT INTO task_templates (name, category, order_num)
+                        SELECT ?, ?, COALESCE(MAX(order_num), 0) + 1 FROM task_templates
+                        WHERE category = ? AND deleted_at IS NULL
+                    ''', (name, category, category))
+                    broadcaster.publish(db, user_id, 'templates', {'category': category})
                     db.commit()
                     flash('Task added successfully.')
                 else:
                     flash('Invalid task name or category.')
             elif action == 'delete_task' and is_parent:
                 task_id = request.form.get('task_id')
-                if task_id:
-                    category = db.execute('SELECT category FROM task_templates WHERE id = ?', (task_id,)).fetchone()['category']
-                    db.execute('DELETE FROM task_templates WHERE id = ?', (task_id,))
-                    # Reorder remaining tasks in category
-                    remaining = db.execute('SELECT id FROM task_templates WHERE category = ? ORDER BY order_num', (category,)).fetchall()
-                    for idx, task in enumerate(remaining, 1):
-                        db.execute('UPDATE task_templates SET order_num = ? WHERE id = ?', (idx, task['id']))
-                    db.commit()
+                task = db.execute('SELECT category FROM task_templates WHERE id = ? AND deleted_at IS NULL',
+                                  (task_id,)).fetchone() if task_id else None
+                if task:
+                    # Hidden, not removed: the kids' past task_instances and their stars stay
+                    with write_transaction(db):
+                        db.execute("UPDATE task_templates SET deleted_at = datetime('now') WHERE id = ?", (task_id,))
+                        db.execute(RENUMBER_CATEGORY, {'category': task['category']})
+                        broadcaster.publish(db, user_id, 'templates', {'category': task['category']})
                     flash('Task deleted successfully.')
                 else:
                     flash('Invalid task ID.')
-            elif action == 'move_task_up' and is_parent:
+            elif action in ('move_task_up', 'move_task_down') and is_parent:
                 task_id = request.form.get('task_id')
                 if task_id:
-                    task = db.execute('SELECT category, order_num FROM task_templates WHERE id = ?', (task_id,)).fetchone()
-                    if task and task['order_num'] > 1:
-                        db.execute('UPDATE task_templates SET order_num = order_num + 1 WHERE category = ? AND order_num = ?', (task['category'], task['order_num'] - 1))
-                        db.execute('UPDATE task_templates SET order_num = order_num - 1 WHERE id = ?', (task_id,))
-                        db.commit()
-                        flash('Task moved up.')
-            elif action == 'move_task_down' and is_parent:
-                task_id = request.form.get('task_id')
-                if task_id:
-                    task = db.execute('SELECT category, order_num FROM task_templates WHERE id = ?', (task_id,)).fetchone()
-                    max_order = db.execute('SELECT MAX(order_num) FROM task_templates WHERE category = ?', (task['category'],)).fetchone()[0]
-                    if task and task['order_num'] < max_order:
-                        db.execute('UPDATE task_templates SET order_num = order_num - 1 WHERE category = ? AND order_num = ?', (task['category'], task['order_num'] + 1))
-                        db.execute('UPDATE task_templates SET order_num = order_num + 1 WHERE id = ?', (task_id,))
-                        db.commit()
-                        flash('Task moved down.')
+                    delta = -1 if action == 'move_task_up' else 1
+                    with write_transaction(db):
+                        db.execute(MOVE_TASK, {'id': task_id, 'delta': delta})
+                        broadcaster.publish(db, user_id, 'templates', {'task_id': task_id})
+                    flash('Task moved up.' if delta < 0 else 'Task moved down.')
+            elif action == 'reorder' and is_parent:
+                category = request.form.get('category')
+                try:
+                    order = [int(task_id) for task_id in request.form.get('order', '').split(',') if task_id]
+                except ValueError:
+                    order = []
+                # A repeated id would join twice and land on either of its positions
+                if category in ['morning', 'evening', 'night'] and order and len(set(order)) == len(order):
+                    with write_transaction(db):
+                        db.execute(REORDER_CATEGORY, {'category': category, 'ids': json.dumps(order)})
+                        broadcaster.publish(db, user_id, 'templates', {'category': category})
+                    flash('Tasks reordered.')
+                else:
+                    flash('Invalid task order.')
     
     with get_db() as db:
         users = db.execute('SELECT * FROM users WHERE id != ?', (user_id,)).fetchall() if is_parent else None
-        tasks = db.execute('SELECT * FROM task_templates ORDER BY category, order_num').fetchall() if is_parent else None
+        tasks = load_templates(db) if is_parent else None
     return render_template('settings.html', is_parent=is_parent, users=users, tasks=tasks)
 
 # Logout
 @app.route('/logout')
 def logout():
-    logger.debug(f"User logged out. Session: {session}")
+    logger.debug("User logged out. Session: %s", session)
     session.clear()
     return redirect(url_for('landing'))
 
-# Serve uploads
+# Cache and connection pool counters (parents only)
+@app.route('/metrics')
+def metrics():
+    if 'user_id' not in session or session['type'] != 'parent':
+        return redirect(url_for('landing'))
+    return jsonify(cache=cache.stats(), db_pool=database.pool_stats(), events=broadcaster.stats())
+
+# Live updates as server-sent events: 'instances' deltas for task buttons and 'stars'
+# totals for the landing page. 'users' and 'templates' events only mark changed users and tasks.
+# Open to anyone for stars, like the landing page itself; task deltas follow the same
+# visibility rules as the JSON day API.
+@app.route('/events')
+def live_events():
+    try:
+        last_id = max(0, int(request.headers.get('Last-Event-ID', '')))
+    except ValueError:
+        last_id = broadcaster.latest_id(get_db())
+    subscription = broadcaster.subscribe(app, last_id, user_id=session.get('user_id'),
+                                         is_parent=session.get('type') == 'parent')
+    if subscription is None:
+        # EventSource gives up on an error status; the page script retries later
+        return Response('Too many live connections.', status=503, headers={'Retry-After': '60'})
+    # The stream must not hold request state: the pooled connection goes back at teardown
+    return Response(broadcaster.stream(subscription), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Per-endpoint latency percentiles and N+1 suspects (parents only, HOME_APP_PERF=1)
+@app.route('/debug/perf')
+def debug_perf():
+    if 'user_id' not in session or session['type'] != 'parent':
+        return redirect(url_for('landing'))
+    monitor = app.extensions.get('perf')
+    if monitor is None:
+        return jsonify(error='Profiling is off; start the app with HOME_APP_PERF=1'), 404
+    return jsonify(monitor.report())
+
+# Serve uploads. Avatar names are content hashes, so they can be cached for good;
+# ETag / If-None-Match handling comes from send_from_directory.
 @app.route('/uploads/<filename>')
 def uploads(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    if avatars.is_avatar(filename):
+        response = send_from_directory(app.config['UPLOAD_FOLDER'], filename, max_age=365 * 24 * 3600)
+        response.cache_control.immutable = True
+        return response
+    return send_from_directory(app.config['UPLOAD_FOLDER'], filename, max_age=3600)
+
+# Queries on task_instances that run on every page view; each must be served by an index
+HOT_QUERIES = [
+    ('SELECT * FROM task_instances WHERE user_id = ? AND date = ?', (1, '2024-01-01')),
+    (LANDING_QUERY, landing_params(datetime(2024, 1, 1))),
+    (HISTORY_QUERY, (1, '2023-01-01', '2024-01-31')),
+    ('SELECT id FROM task_instances WHERE user_id = ? LIMIT ?', (1, DELETE_BATCH_SIZE)),
+]
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create or upgrade the schema and add the default parent account."""
+    init_db()
+    print(f"Database ready at {app.config['DATABASE']}.")
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations."""
+    with get_db() as db:
+        applied = migrations.migrate(db)
+        version = migrations.current_version(db)
+    print(f'Applied migrations {applied}; schema is at version {version}.' if applied
+          else f'Schema is up to date at version {version}.')
+
+@app.cli.command('backfill-stats')
+def backfill_stats_command():
+    """Rebuild the daily_stats rollup from task_instances."""
+    with write_transaction(get_db()) as db:
+        migrations.backfill_daily_stats(db)
+    count = db.execute('SELECT COUNT(*) FROM daily_stats').fetchone()[0]
+    print(f'Rebuilt daily_stats: {count} rows.')
+
+@app.cli.command('backfill-avatars')
+def backfill_avatars_command():
+    """Generate thumbnails for profile pictures stored before avatars existed."""
+    db = get_db()
+    pics = [row[0] for row in db.execute('SELECT DISTINCT profile_pic FROM users WHERE profile_pic IS NOT NULL')]
+    converted = 0
+    for pic in pics:
+        path = os.path.join(app.config['UPLOAD_FOLDER'], pic)
+        if avatars.is_avatar(pic) or pic == avatars.DEFAULT_PIC or not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            try:
+                filename = avatars.save_avatar(f.read(), app.config['UPLOAD_FOLDER'])
+            except ValueError as e:
+                print(f'Skipping {pic}: {e}')
+                continue
+        db.execute('UPDATE users SET profile_pic = ? WHERE profile_pic = ?', (filename, pic))
+        db.commit()
+        converted += 1
+        print(f'{pic} -> {filename}')
+    print(f'Converted {converted} profile pictures. Originals were left in place.')
+
+@app.cli.command('materialize')
+@click.option('--days', default=2, show_default=True, help='Number of days to create, starting today.')
+def materialize_command(days):
+    """Create every kid's task instances ahead of the first /home visit."""
+    today = datetime.now()
+    dates = [(today + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+    added = maintenance.materialize_days(get_db(), dates)
+    print(f'Created {added} task instances for {", ".join(dates)}.')
+
+@app.cli.command('archive')
+@click.option('--after-days', type=int, help='Archive days older than this. Defaults to ARCHIVE_AFTER_DAYS.')
+def archive_command(after_days):
+    """Move old task instances into the archive database."""
+    before = archive_cutoff(after_days)
+    moved = maintenance.archive_task_instances(get_db(), app.config['ARCHIVE_DATABASE'], before)
+    print(f"Archived {moved} task instances dated before {before} to {app.config['ARCHIVE_DATABASE']}.")
+
+@app.cli.command('backup')
+@click.argument('dest')
+def backup_command(dest):
+    """Copy home.db (and the archive database, if any) to DEST with the online backup API."""
+    maintenance.backup_database(get_db(), dest)
+    print(f'Backed up {app.config["DATABASE"]} to {dest}.')
+    archive = app.config['ARCHIVE_DATABASE']
+    if os.path.exists(archive):
+        root, ext = os.path.splitext(dest)
+        archive_dest = f'{root}-archive{ext or ".db"}'
+        conn = sqlite3.connect(archive)
+        try:
+            maintenance.backup_database(conn, archive_dest)
+        finally:
+            conn.close()
+        print(f'Backed up {archive} to {archive_dest}.')
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Rebuild the fingerprinted and compressed copies of static/ files."""
+    manifest = assets.build(app.static_folder)
+    for name, hashed in sorted(manifest.items()):
+        path = os.path.join(app.static_folder, hashed)
+        sizes = [f'{os.path.getsize(path):,} B']
+        sizes += [f'{suffix} {os.path.getsize(path + suffix):,} B'
+                  for _, suffix, _ in assets.ENCODINGS if os.path.exists(path + suffix)]
+        print(f'{name} -> {hashed} ({", ".join(sizes)})')
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any hot query falls back to a full scan of task_instances."""
+    db = get_db()
+    failures = [(sql, scan) for sql, params in HOT_QUERIES for scan in migrations.table_scans(db, sql, params)]
+    for sql, scan in failures:
+        print(f'{scan}: {sql}')
+    if failures:
+        raise SystemExit(1)
+    print(f'All {len(HOT_QUERIES)} hot queries use an index.')
 
 if __name__ == '__main__':
+    # Development server; production runs wsgi.py under gunicorn (see gunicorn.conf.py)
+    with app.app_context():
+        init_db()
     app.run(debug=True)
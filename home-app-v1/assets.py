@@ -0,0 +1,146 @@
+"""Fingerprinted, precompressed static files.
+
+build() copies every file in static/ to static/dist/, under a name carrying a
+hash of its content (style.css -> style.1a2b3c4d5e6f.css). Next to each text
+file it writes a .gz copy, and a .br copy too when the brotli package is
+installed. The names are recorded in static/dist/manifest.json. The default
+profile picture also gets its avatar thumbnails there (default-128.jpg, ...).
+
+init_app() does three things:
+- builds whenever a source file is newer than the manifest
+- rewrites url_for('static', filename=...) to the hashed name
+- serves hashed files with a one-year immutable Cache-Control, choosing the
+  .br or .gz copy the browser accepts
+
+A changed file gets a new URL, so nothing has to be purged from caches.
+Files that are not in the manifest are served as before.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+
+from flask import request, send_from_directory
+
+import avatars
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = {'.css', '.js', '.json', '.svg', '.txt', '.html'}
+ONE_YEAR = 365 * 24 * 3600
+
+# Preferred first: brotli is smaller than gzip at the same speed to decode
+ENCODINGS = [('gzip', '.gz', lambda data: gzip.compress(data, 9, mtime=0))]
+if brotli is not None:
+    ENCODINGS.insert(0, ('br', '.br', lambda data: brotli.compress(data, quality=11)))
+
+
+def _write(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _sources(static_dir):
+    return sorted(name for name in os.listdir(static_dir)
+                  if os.path.isfile(os.path.join(static_dir, name)) and not name.startswith('.'))
+
+
+def build(static_dir):
+    """Write the fingerprinted and compressed copies of `static_dir`'s files and return the manifest."""
+    dist_dir = os.path.join(static_dir, DIST)
+    os.makedirs(dist_dir, exist_ok=True)
+    files = {}
+    for name in _sources(static_dir):
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            files[name] = f.read()
+        if name == avatars.DEFAULT_PIC:
+            for size, ext, encoded in avatars.thumbnails(files[name]):
+                files[avatars.default_filename(size, ext)] = encoded
+
+    manifest = {}
+    keep = {MANIFEST}
+    for name, data in files.items():
+        root, ext = os.path.splitext(name)
+        hashed = f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        manifest[name] = f'{DIST}/{hashed}'
+        keep.add(hashed)
+        path = os.path.join(dist_dir, hashed)
+        if not os.path.exists(path):
+            _write(path, data)
+        if ext not in COMPRESSIBLE:
+            continue
+        for _, suffix, compress in ENCODINGS:
+            keep.add(hashed + suffix)
+            if not os.path.exists(path + suffix):
+                _write(path + suffix, compress(data))
+
+    # Drop copies of older versions
+    for name in os.listdir(dist_dir):
+        if name not in keep:
+            os.remove(os.path.join(dist_dir, name))
+    _write(os.path.join(dist_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def is_stale(static_dir):
+    manifest_path = os.path.join(static_dir, DIST, MANIFEST)
+    try:
+        built = os.path.getmtime(manifest_path)
+        with open(manifest_path) as f:
+            names = set(json.load(f))
+    except (OSError, ValueError):
+        return True
+    sources = _sources(static_dir)
+    return (not names.issuperset(sources)
+            or any(os.path.getmtime(os.path.join(static_dir, name)) > built for name in sources))
+
+
+def load(static_dir):
+    """Return the manifest, building it first if static/ changed since the last build."""
+    if is_stale(static_dir):
+        manifest = build(static_dir)
+        logger.info('Built %d static assets into %s', len(manifest), os.path.join(static_dir, DIST))
+        return manifest
+    with open(os.path.join(static_dir, DIST, MANIFEST)) as f:
+        return json.load(f)
+
+
+def init_app(app):
+    static_dir = app.static_folder
+    app.extensions['assets'] = load(static_dir)
+
+    def hashed_static_url(endpoint, values):
+        if endpoint == 'static':
+            hashed = app.extensions['assets'].get(values.get('filename'))
+            if hashed:
+                values['filename'] = hashed
+
+    def static(filename):
+        if not filename.startswith(f'{DIST}/'):
+            return app.send_static_file(filename)
+        # The content of a hashed name never changes, so browsers may keep it for good
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix, _ in ENCODINGS:
+            if request.accept_encodings[encoding] and os.path.isfile(os.path.join(static_dir, filename + suffix)):
+                response = send_from_directory(static_dir, filename + suffix, mimetype=mimetype, max_age=ONE_YEAR)
+                response.content_encoding = encoding
+                break
+        else:
+            response = send_from_directory(static_dir, filename, max_age=ONE_YEAR)
+        response.cache_control.immutable = True
+        response.vary.add('Accept-Encoding')
+        return response
+
+    app.url_defaults(hashed_static_url)
+    app.view_functions['static'] = static
@@ -0,0 +1,83 @@
+"""Profile picture thumbnails.
+
+Uploaded photos are cropped to a square and downscaled once, at save time, into
+every size in AVATAR_SIZES as both WebP and JPEG. Files are named after a hash
+of the original upload (e.g. 3f2a9c0d1b4e5f60-256.jpg), so a name always refers
+to the same bytes and can be cached by browsers forever.
+"""
+import hashlib
+import io
+import os
+import re
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+AVATAR_SIZES = (128, 256)
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 6}),
+           'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True})}
+AVATAR_RE = re.compile(r'^(?P<digest>[0-9a-f]{16})-(?P<size>\d+)\.(?P<ext>jpg|webp)$')
+# users.profile_pic of accounts without a photo. Its thumbnails are built from
+# static/default.png with the other static assets (see assets.py).
+DEFAULT_PIC = 'default.png'
+
+
+def is_avatar(filename):
+    return bool(filename and AVATAR_RE.match(filename))
+
+
+def avatar_filename(digest, size, ext='jpg'):
+    return f'{digest}-{size}.{ext}'
+
+
+def default_filename(size, ext='jpg'):
+    return f'default-{size}.{ext}'
+
+
+def variant(filename, size, ext='jpg'):
+    """Return the `size`/`ext` variant of an avatar filename, or None for non-avatar files."""
+    match = AVATAR_RE.match(filename or '')
+    return avatar_filename(match['digest'], size, ext) if match else None
+
+
+def thumbnails(data):
+    """Return (size, ext, encoded bytes) for every avatar variant of the image bytes `data`.
+
+    Raises ValueError if `data` is not an image Pillow can read.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # Let the JPEG decoder downscale while decoding; full-size phone photos are slow to load
+            img.draft('RGB', (max(AVATAR_SIZES) * 2, max(AVATAR_SIZES) * 2))
+            img = ImageOps.exif_transpose(img).convert('RGB')
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise ValueError(f'Unreadable image: {e}') from e
+
+    variants = []
+    for size in AVATAR_SIZES:
+        thumb = ImageOps.fit(img, (size, size), Image.LANCZOS)
+        for ext, (fmt, options) in FORMATS.items():
+            buf = io.BytesIO()
+            thumb.save(buf, fmt, **options)
+            variants.append((size, ext, buf.getvalue()))
+    return variants
+
+
+def save_avatar(data, folder):
+    """Write every thumbnail of the image bytes `data` into `folder`.
+
+    Returns the filename to store in users.profile_pic (the largest JPEG).
+    Raises ValueError if `data` is not an image Pillow can read.
+    """
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    largest = avatar_filename(digest, max(AVATAR_SIZES))
+    if all(os.path.exists(os.path.join(folder, avatar_filename(digest, size, ext)))
+           for size in AVATAR_SIZES for ext in FORMATS):
+        return largest  # Same photo uploaded before
+
+    for size, ext, encoded in thumbnails(data):
+        path = os.path.join(folder, avatar_filename(digest, size, ext))
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(encoded)
+        os.replace(tmp_path, path)
+    return largest
@@ -0,0 +1,9 @@
+"""Benchmarks for the home app. Run the modules from home-app-v1/:
+
+    python -m bench.suite            # scripted sessions, JSON results, regression check
+    python -m bench.datagen          # write a synthetic family into a home.db
+    python -m bench.bench_home       # GET /home req/s by template count
+    python -m bench.bench_landing    # GET / over years of history
+    python -m bench.bench_sessions   # session backend overhead
+    python -m bench.loadtest         # HTTP load against real servers
+"""
@@ -0,0 +1,57 @@
+"""Requests/sec for GET /home at different template counts.
+
+Run from home-app-v1/:  python -m bench.bench_home [--seconds 3]
+
+Each run gets a fresh home.db in a temp directory, one kid, and N task
+templates. The first request for a day materializes the instances; the rest
+of the run measures the steady-state page build.
+"""
+import argparse
+import tempfile
+import time
+
+from .common import CATEGORIES, load_app, login
+
+
+def seed(app_module, n_templates):
+    with app_module.app.app_context(), app_module.get_db() as db:
+        db.execute('DELETE FROM task_instances')
+        db.execute('DELETE FROM task_templates')
+        db.execute("DELETE FROM users WHERE type = 'kid'")
+        cur = db.execute("INSERT INTO users (name, type, passcode, profile_pic) VALUES ('Kid', 'kid', 'x', 'default.png')")
+        kid_id = cur.lastrowid
+        db.executemany('INSERT INTO task_templates (name, category, order_num) VALUES (?, ?, ?)',
+                       [(f'Task {i}', CATEGORIES[i % 3], i // 3 + 1) for i in range(n_templates)])
+        db.commit()
+    app_module.cache.clear()
+    return kid_id
+
+
+def run(app_module, kid_id, seconds):
+    client = app_module.app.test_client()
+    login(client, kid_id, 'kid', kid_id)
+    assert client.get('/home').status_code == 200
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        client.get('/home')
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--templates', type=int, nargs='+', default=[10, 50, 200])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app_module = load_app(workdir)
+        print(f'{"templates":>10} {"req/s":>10}')
+        for n in args.templates:
+            kid_id = seed(app_module, n)
+            print(f'{n:>10} {run(app_module, kid_id, args.seconds):>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
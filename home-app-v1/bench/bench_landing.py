@@ -0,0 +1,53 @@
+"""Latency of GET / (the landing dashboard) over years of star history.
+
+Run from home-app-v1/:  python -m bench.bench_landing [--kids 10 --tasks 30 --years 5]
+
+Builds a synthetic family (bench.datagen) with Y years of history in a temp
+home.db and reports mean and p95 latency of the landing page.
+"""
+import argparse
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from . import datagen
+from .common import load_app
+
+
+def seed(app_module, kids, tasks, years):
+    db = sqlite3.connect(app_module.app.config['DATABASE'])
+    try:
+        return datagen.generate(db, kids, tasks, years)['instances']
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--kids', type=int, default=10)
+    parser.add_argument('--tasks', type=int, default=30)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app_module = load_app(workdir)
+        start = time.perf_counter()
+        n_rows = seed(app_module, args.kids, args.tasks, args.years)
+        print(f'seeded {n_rows} task_instances in {time.perf_counter() - start:.1f}s')
+
+        client = app_module.app.test_client()
+        assert client.get('/').status_code == 200
+        timings = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            client.get('/')
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(f'GET /  mean {statistics.mean(timings):.2f} ms  '
+              f'p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms  over {args.requests} requests')
+
+
+if __name__ == '__main__':
+    main()
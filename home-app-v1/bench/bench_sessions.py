@@ -0,0 +1,58 @@
+"""Per-request session overhead for each session backend.
+
+Run from home-app-v1/:  python -m bench.bench_sessions [--requests 2000]
+
+Each backend runs in its own process (the backend is picked at import time).
+A logged-in parent then makes read-only requests (GET /kids, session
+unchanged) and session-writing requests (GET /set_view/<id>).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from .common import APP_DIR, load_app
+
+BACKENDS = ['filesystem', 'sqlite', 'cookie']
+
+
+def measure(client, path, n):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        client.get(path)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return statistics.mean(timings)
+
+
+def child(backend, n):
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ['HOME_APP_SESSION_BACKEND'] = backend
+        app_module = load_app(workdir)
+        client = app_module.app.test_client()
+        assert client.post('/login/1', data={'passcode': '1234'}).status_code == 302
+        read_only = measure(client, '/kids', n)
+        writing = measure(client, '/set_view/1', n)
+        print(f'{backend:<12} {read_only:>14.0f} {writing:>14.0f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--backend', choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        child(args.backend, args.requests)
+        return
+    print(f'{"backend":<12} {"GET /kids µs":>14} {"set_view µs":>14}')
+    for backend in BACKENDS:
+        subprocess.run([sys.executable, '-m', 'bench.bench_sessions', '--backend', backend, '--requests', str(args.requests)],
+                       cwd=APP_DIR, check=True)
+
+
+if __name__ == '__main__':
+    main()
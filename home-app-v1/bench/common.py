@@ -0,0 +1,41 @@
+"""Shared setup for the benchmark modules in this package."""
+import logging
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATEGORIES = ['morning', 'evening', 'night']
+
+
+def load_app(workdir, perf=False):
+    """Import app.py against a fresh home.db (and session/upload dirs) in `workdir`.
+
+    perf=True turns on the app's request instrumentation (perf.py), which adds
+    Server-Timing headers with per-request query counts.
+    """
+    os.chdir(workdir)
+    os.environ['HOME_APP_DATABASE'] = os.path.join(workdir, 'home.db')
+    if perf:
+        os.environ['HOME_APP_PERF'] = '1'
+    sys.path.insert(0, APP_DIR)
+    logging.disable(logging.INFO)
+    import app as app_module
+    with app_module.app.app_context():
+        app_module.init_db()
+    return app_module
+
+
+def init_database(db_path):
+    """Create or migrate the home.db at `db_path` with the app's own init-db command."""
+    subprocess.run([sys.executable, '-m', 'flask', '--app', os.path.join(APP_DIR, 'app.py'), 'init-db'], check=True,
+                   env={**os.environ, 'HOME_APP_DATABASE': db_path, 'HOME_APP_LOG_LEVEL': 'WARNING'},
+                   stdout=subprocess.DEVNULL)
+
+
+def login(client, user_id, user_type, view_user_id=None):
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['type'] = user_type
+        if view_user_id is not None:
+            sess['view_user_id'] = view_user_id
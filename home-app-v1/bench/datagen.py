@@ -0,0 +1,86 @@
+"""Synthetic family data for benchmarks.
+
+    python -m bench.datagen --out /tmp/home.db --kids 4 --templates 20 --years 2
+
+Adds N kids and M task templates to a home.db, plus Y years of task_instances
+up to yesterday. Today is left for the app to materialize on the first visit,
+as in production. The data is meant to look like a real family:
+- every kid has their own diligence and every task its own ease
+- a task is done with probability diligence x ease (about 55-90%)
+- STAR_RATE of done tasks are starred
+- SKIP_RATE of days have no rows at all, like days nobody opened the app
+The same seed always gives the same database.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from .common import CATEGORIES, init_database
+
+STAR_RATE = 0.6
+SKIP_RATE = 0.05
+KID_PASSCODE = '0000'
+
+
+def generate(db, kids=4, templates=20, years=1, seed=42, today=None):
+    """Insert the synthetic family into `db`, a connection to a migrated home.db.
+
+    Returns {'kid_ids': [...], 'template_ids': [...], 'instances': count}.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    passcode = generate_password_hash(KID_PASSCODE)
+    kid_ids = [db.execute("INSERT INTO users (name, type, passcode, profile_pic) VALUES (?, 'kid', ?, 'default.png')",
+                          (f'Kid {k + 1}', passcode)).lastrowid
+               for k in range(kids)]
+    template_ids = [db.execute('INSERT INTO task_templates (name, category, order_num) VALUES (?, ?, ?)',
+                               (f'Task {t + 1}', CATEGORIES[t % 3], t // 3 + 1)).lastrowid
+                    for t in range(templates)]
+    diligence = {kid_id: rng.uniform(0.6, 0.95) for kid_id in kid_ids}
+    ease = {template_id: rng.uniform(0.85, 1.0) for template_id in template_ids}
+    days = [(today - timedelta(days=d)).isoformat() for d in range(1, round(365.25 * years) + 1)]
+
+    def rows():
+        for kid_id in kid_ids:
+            for day in days:
+                if rng.random() < SKIP_RATE:
+                    continue
+                for template_id in template_ids:
+                    done = rng.random() < diligence[kid_id] * ease[template_id]
+                    yield template_id, kid_id, day, int(done), int(done and rng.random() < STAR_RATE)
+
+    cur = db.executemany('INSERT INTO task_instances (task_template_id, user_id, date, done, starred) VALUES (?, ?, ?, ?, ?)',
+                         rows())
+    db.commit()
+    return {'kid_ids': kid_ids, 'template_ids': template_ids, 'instances': cur.rowcount}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', required=True, help='home.db to create or add to')
+    parser.add_argument('--kids', type=int, default=4)
+    parser.add_argument('--templates', type=int, default=20)
+    parser.add_argument('--years', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    db_path = os.path.abspath(args.out)
+    init_database(db_path)
+    start = time.perf_counter()
+    db = sqlite3.connect(db_path)
+    try:
+        result = generate(db, args.kids, args.templates, args.years, args.seed)
+    finally:
+        db.close()
+    print(f"{db_path}: {len(result['kid_ids'])} kids, {len(result['template_ids'])} templates, "
+          f"{result['instances']} task_instances in {time.perf_counter() - start:.1f}s "
+          f"(kid passcode {KID_PASSCODE}, parent 1234)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""HTTP load test for /, /home and /history.
+
+    python -m bench.loadtest --compare                 # dev server vs gunicorn on a seeded temp DB
+    python -m bench.loadtest --url http://host:5000    # an already running server
+
+Each client thread logs in as the default parent (passcode 1234), picks a kid
+with /set_view and then requests the paths round-robin for --duration seconds.
+"""
+import argparse
+import http.cookiejar
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from . import datagen
+from .common import APP_DIR, init_database
+
+PATHS = ['/', '/home', '/history']
+
+
+def seed(db_path, kids=4, tasks=20, years=1):
+    init_database(db_path)
+    db = sqlite3.connect(db_path)
+    try:
+        return datagen.generate(db, kids, tasks, years)['kid_ids']
+    finally:
+        db.close()
+
+
+def client(base_url, kid_id, deadline, paths, results, errors):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    opener.open(f'{base_url}/login/1', urllib.parse.urlencode({'passcode': '1234'}).encode()).read()
+    opener.open(f'{base_url}/set_view/{kid_id}').read()
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            opener.open(base_url + path).read()
+        except OSError:
+            errors.append(path)
+            continue
+        results.setdefault(path, []).append(time.perf_counter() - start)
+
+
+def run_load(base_url, kid_ids, concurrency, duration, paths):
+    results, errors = {}, []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=client, args=(base_url, kid_ids[i % len(kid_ids)], deadline, paths, results, errors))
+               for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def report(name, results, errors, duration):
+    total = sum(len(v) for v in results.values())
+    print(f'\n{name}: {total / duration:.1f} req/s overall, {len(errors)} errors')
+    print(f'  {"path":<10} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8}')
+    for path, timings in sorted(results.items()):
+        timings.sort()
+        p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+        print(f'  {path:<10} {len(timings) / duration:>8.1f} {statistics.median(timings) * 1000:>8.1f} {p95 * 1000:>8.1f}')
+
+
+def wait_until_up(base_url, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'server exited with {proc.returncode}')
+        try:
+            urllib.request.urlopen(base_url + '/').read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server at {base_url} did not start')
+
+
+# Servers run from the temp dir so their session files land there, not in the app dir
+SERVERS = {
+    'flask run (dev server)': [sys.executable, '-m', 'flask', '--app', os.path.join(APP_DIR, 'app.py'),
+                               'run', '--port', '{port}'],
+    'gunicorn wsgi:application': [sys.executable, '-m', 'gunicorn', '-c', os.path.join(APP_DIR, 'gunicorn.conf.py'),
+                                  '--pythonpath', APP_DIR, '--bind', '127.0.0.1:{port}', 'wsgi:application'],
+}
+
+
+def compare(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'home.db')
+        kid_ids = seed(db_path)
+        env = {**os.environ, 'HOME_APP_DATABASE': db_path, 'HOME_APP_LOG_LEVEL': 'WARNING'}
+        for name, command in SERVERS.items():
+            base_url = f'http://127.0.0.1:{args.port}'
+            proc = subprocess.Popen([part.format(port=args.port) for part in command], cwd=workdir, env=env,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_until_up(base_url, proc)
+                results, errors = run_load(base_url, kid_ids, args.concurrency, args.duration, args.paths)
+                report(name, results, errors, args.duration)
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='base URL of a running server')
+    parser.add_argument('--compare', action='store_true', help='start the dev server and gunicorn in turn')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--kid-ids', type=int, nargs='+', default=[2])
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--paths', nargs='+', default=PATHS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args)
+    elif args.url:
+        results, errors = run_load(args.url.rstrip('/'), args.kid_ids, args.concurrency, args.duration, args.paths)
+        report(args.url, results, errors, args.duration)
+    else:
+        parser.error('pass --url or --compare')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""Scripted-session benchmark with JSON results and regression checks.
+
+    python -m bench.suite                                           # 4 kids x 20 tasks x 1 year
+    python -m bench.suite --kids 10 --templates 30 --years 5 --out after.json
+    python -m bench.suite --baseline before.json                    # exit 1 on regression
+
+Builds a synthetic family (bench.datagen) in a temp home.db, then replays a
+parent's session through the Flask test client: login, /kids, /set_view,
+/home, a done toggle, the JSON day and PATCH APIs, star all, /history, the
+landing page, logout. The session repeats for --sessions rounds, cycling
+through the kids, after --warmup rounds that are not recorded.
+
+Reported for each step:
+- p50, p95 and p99 latency
+- SQL statements per request, read from the Server-Timing header that perf.py
+  adds. Session writes are not included.
+- how far the process's peak RSS rose during the step, summed over the
+  recorded sessions. Warmup takes most of the growth, so anything above 0 here
+  points at a step that keeps allocating.
+- the step's peak Python allocation, from one extra traced session
+
+With --baseline, a step regresses when its p95 is more than --tolerance slower
+and more than --min-ms slower, or when it runs more queries than before.
+"""
+import argparse
+import json
+import platform
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+from . import datagen
+from .common import load_app
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries')
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # bytes on macOS, KiB on Linux
+
+
+def session_script(client, kid_id, today):
+    """Yield (step name, response) for one parent session looking after `kid_id`."""
+    yield 'POST /login', client.post('/login/1', data={'passcode': '1234'})
+    yield 'GET /kids', client.get('/kids')
+    yield 'GET /set_view', client.get(f'/set_view/{kid_id}')
+    yield 'GET /home', client.get('/home')
+    day = client.get(f'/api/users/{kid_id}/days/{today}')
+    yield 'GET /api/days', day
+    ids = [task['id'] for task in day.get_json()['tasks']]
+    yield 'POST /home toggle_done', client.post('/home', data={'action': 'toggle_done', 'instance_id': ids[0]})
+    yield 'PATCH /api/instances', client.patch('/api/instances', json={
+        'changes': [{'id': i, 'done': True, 'starred': n % 2 == 0} for n, i in enumerate(ids[1:4])]})
+    yield 'POST /home star_all', client.post('/home', data={'action': 'star_all'})
+    yield 'GET /history', client.get('/history')
+    yield 'GET /', client.get('/')
+    yield 'GET /logout', client.get('/logout')
+
+
+def timed_steps(script):
+    """Run `script`, yielding (step, response, seconds) with each step's own latency."""
+    start = time.perf_counter()
+    for step, response in script:
+        yield step, response, time.perf_counter() - start
+        start = time.perf_counter()
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run(app_module, kid_ids, sessions, warmup):
+    client = app_module.app.test_client()
+    today = date.today().isoformat()
+    samples = {}
+    rss = peak_rss_kb()
+    for n in range(warmup + sessions):
+        for step, response, seconds in timed_steps(session_script(client, kid_ids[n % len(kid_ids)], today)):
+            # ru_maxrss only ever rises, so what a step adds is the rise while it ran
+            rss_before, rss = rss, peak_rss_kb()
+            if response.status_code >= 400:
+                raise RuntimeError(f'{step} returned {response.status_code}')
+            if n < warmup:
+                continue
+            queries = QUERIES_RE.search(', '.join(response.headers.getlist('Server-Timing')))
+            entry = samples.setdefault(step, {'ms': [], 'queries': [], 'rss_growth_kb': 0 if rss is not None else None})
+            entry['ms'].append(seconds * 1000)
+            entry['queries'].append(int(queries.group(1)) if queries else 0)
+            if rss is not None:
+                entry['rss_growth_kb'] += rss - rss_before
+
+    # Allocation peaks come from a separate pass; tracing would distort the timings above
+    tracemalloc.start()
+    try:
+        script = session_script(client, kid_ids[0], today)
+        while True:
+            tracemalloc.reset_peak()
+            try:
+                step, _ = next(script)
+            except StopIteration:
+                break
+            samples[step]['alloc_peak_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+    results = {}
+    for step, entry in samples.items():
+        ms = sorted(entry['ms'])
+        results[step] = {
+            'count': len(ms),
+            'mean_ms': round(sum(ms) / len(ms), 3),
+            'p50_ms': round(percentile(ms, 50), 3),
+            'p95_ms': round(percentile(ms, 95), 3),
+            'p99_ms': round(percentile(ms, 99), 3),
+            'queries': round(sum(entry['queries']) / len(entry['queries']), 2),
+            'rss_growth_kb': entry['rss_growth_kb'],
+            'alloc_peak_kb': entry.get('alloc_peak_kb'),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance, min_ms):
+    """Return a list of regression messages for steps in both runs."""
+    regressions = []
+    for step, now in results['steps'].items():
+        before = baseline['steps'].get(step)
+        if before is None:
+            continue
+        slower = now['p95_ms'] - before['p95_ms']
+        if now['p95_ms'] > before['p95_ms'] * (1 + tolerance) and slower > min_ms:
+            regressions.append(f'{step}: p95 {before["p95_ms"]:.2f} -> {now["p95_ms"]:.2f} ms')
+        if now['queries'] > before['queries']:
+            regressions.append(f'{step}: queries {before["queries"]:g} -> {now["queries"]:g}')
+    return regressions
+
+
+def print_table(results, baseline=None):
+    print(f'{"step":<26} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"rss +KiB":>9} {"alloc KiB":>10}'
+          + (f' {"p95 was":>8}' if baseline else ''))
+    for step, r in results['steps'].items():
+        line = (f'{step:<26} {r["p50_ms"]:>8.2f} {r["p95_ms"]:>8.2f} {r["p99_ms"]:>8.2f} {r["queries"]:>8g} '
+                f'{r["rss_growth_kb"] or 0:>9} {r["alloc_peak_kb"] or 0:>10}')
+        if baseline:
+            before = baseline['steps'].get(step)
+            line += f' {before["p95_ms"]:>8.2f}' if before else f' {"-":>8}'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--kids', type=int, default=4)
+    parser.add_argument('--templates', type=int, default=20)
+    parser.add_argument('--years', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--sessions', type=int, default=50, help='recorded sessions')
+    parser.add_argument('--warmup', type=int, default=2, help='unrecorded sessions run first')
+    parser.add_argument('--out', help='write results JSON here')
+    parser.add_argument('--baseline', help='results JSON from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown as a fraction')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='ignore p95 slowdowns smaller than this')
+    args = parser.parse_args()
+
+    params = {'kids': args.kids, 'templates': args.templates, 'years': args.years, 'seed': args.seed,
+              'sessions': args.sessions, 'warmup': args.warmup}
+    with tempfile.TemporaryDirectory() as workdir:
+        app_module = load_app(workdir, perf=True)
+        start = time.perf_counter()
+        db = sqlite3.connect(app_module.app.config['DATABASE'])
+        try:
+            data = datagen.generate(db, args.kids, args.templates, args.years, args.seed)
+        finally:
+            db.close()
+        seed_seconds = time.perf_counter() - start
+        print(f"seeded {data['instances']} task_instances in {seed_seconds:.1f}s", file=sys.stderr)
+        steps = run(app_module, data['kid_ids'], args.sessions, args.warmup)
+
+    results = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.platform(),
+            'params': params,
+            'instances': data['instances'],
+        },
+        'steps': steps,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta']['params'] != params:
+            print(f"warning: baseline was run with {baseline['meta']['params']}", file=sys.stderr)
+    print_table(results, baseline)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance, args.min_ms)
+        for message in regressions:
+            print(f'REGRESSION {message}')
+        if regressions:
+            sys.exit(1)
+        print('no regressions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """A bounded, thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    Keys are tuples whose first item names what is cached, e.g. ('landing', '2024-05-01'),
+    so invalidate('landing') drops every entry of that kind.
+    """
+
+    def __init__(self, maxsize=256, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by invalidate() so in-flight loads don't store stale values
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+        # Load outside the lock; two threads missing at once both load, which is harmless
+        value = loader()
+        with self._lock:
+            if generation != self._generation:
+                return value
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, *names):
+        """Drop every entry whose key starts with one of `names`."""
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._entries if k[0] in names]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,187 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g
+
+# Applied to every new connection. journal_mode=WAL is persistent in the file,
+# the rest are per-connection settings.
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA foreign_keys = ON',
+)
+
+
+class ConnectionPool:
+    """A small thread-safe pool of SQLite connections.
+
+    Connections are handed out one request at a time and kept open between
+    requests, so their pragma setup and prepared statement cache survive.
+    A forked child does not reuse connections its parent opened; SQLite
+    connections must not be carried across fork().
+    """
+
+    def __init__(self, path, size=5, timeout=10.0, busy_timeout_ms=5000, cached_statements=256):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._inherited = []
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000,
+                               check_same_thread=False, cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _after_fork(self):
+        # Keep the parent's connections referenced but untouched: closing one here could
+        # checkpoint or delete the WAL under the parent
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            while True:
+                try:
+                    self._inherited.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            self._slots = threading.BoundedSemaphore(self.size)
+            self._pid = os.getpid()
+
+    def acquire(self):
+        if self._pid != os.getpid():
+            self._after_fork()
+        start = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            # Every connection is checked out: wait for one to come back
+            if not self._slots.acquire(timeout=self.timeout):
+                raise sqlite3.OperationalError('Timed out waiting for a database connection')
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - start
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+            with self._lock:
+                self.misses += 1
+        else:
+            with self._lock:
+                self.hits += 1
+        return conn
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+        else:
+            self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': self.size,
+                'idle': self._idle.qsize(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'waits': self.waits,
+                'wait_time_ms': round(self.wait_time * 1000, 3),
+            }
+
+
+class BackgroundThread:
+    """A daemon thread running `target`, started on first use in each process.
+
+    Not started at import: threads do not survive fork(), so each gunicorn
+    worker starts its own rather than relying on one from the master.
+    """
+
+    def __init__(self, target, name):
+        self.target = target
+        self.name = name
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self, *args):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self.target, args=args, name=self.name, daemon=True).start()
+
+
+def get_db():
+    """Return this app context's connection, checking one out of the pool on first use."""
+    if 'db' not in g:
+        conn = current_app.extensions['db_pool'].acquire()
+        # Extensions such as perf may wrap the connection; close_db hands back the raw one
+        wrap = current_app.extensions.get('db_wrap')
+        g.db = wrap(conn) if wrap else conn
+    return g.db
+
+
+@contextmanager
+def write_transaction(db):
+    """Run the block in a BEGIN IMMEDIATE transaction: take the write lock up front, commit or roll back."""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        yield db
+    except BaseException:
+        db.rollback()
+        raise
+    db.commit()
+
+
+def close_db(exc=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        current_app.extensions['db_pool'].release(getattr(conn, 'raw', conn))
+
+
+def init_app(app):
+    app.extensions['db_pool'] = ConnectionPool(
+        app.config['DATABASE'],
+        size=app.config['DB_POOL_SIZE'],
+        timeout=app.config['DB_POOL_TIMEOUT'],
+        busy_timeout_ms=app.config['DB_BUSY_TIMEOUT_MS'],
+    )
+    app.teardown_appcontext(close_db)
+
+
+def pool_stats():
+    return current_app.extensions['db_pool'].stats()
@@ -0,0 +1,141 @@
+"""Live updates for open dashboards, sent as server-sent events from /events.
+
+Writes to task instances and users publish a small delta into the
+change_events table, in the same transaction as the write. Each process runs
+one poller thread. It reads new rows and hands them to the /events streams
+open in that process. That way a change made in any gunicorn worker reaches
+every dashboard. Writes in the same process wake the poller at once. Writes in
+other processes are seen within the poll interval.
+
+The id of the newest event of a type (version()) also keys the app's cached
+templates and landing page. A write in any process changes it, so no process
+serves those caches stale.
+
+Each open stream is a generator waiting on a queue. Under gunicorn's gevent
+worker (the default in gunicorn.conf.py) a waiting stream is only a greenlet,
+and hundreds are cheap. Under the gthread worker it holds one worker thread, so
+max_streams caps how many a process accepts.
+"""
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from db import BackgroundThread
+
+logger = logging.getLogger(__name__)
+
+RETRY_MS = 5000  # how long EventSource waits before reconnecting
+PRUNE_INTERVAL = 60  # seconds between deletes of expired change_events in each process
+
+
+class Subscription:
+    def __init__(self, last_id, user_id, is_parent):
+        self.last_id = last_id
+        self.user_id = user_id
+        self.is_parent = is_parent
+        self.queue = queue.SimpleQueue()
+
+    def wants(self, event_type, user_id):
+        # Star totals are on the public landing page; task details follow the /api/users/<id>/days rules
+        return event_type == 'stars' or self.is_parent or user_id == self.user_id
+
+
+class ChangeBroadcaster:
+    def __init__(self, poll_interval=1.0, heartbeat=15.0, retention=600, max_streams=500):
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.retention = retention
+        self.max_streams = max_streams
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._poller = BackgroundThread(self._poll_loop, 'change-poller')
+        self._pruned_at = 0
+
+    def publish(self, db, user_id, event_type, data):
+        """Record an event in the caller's transaction; call notify() once it commits."""
+        now = int(time.time())
+        if now - self._pruned_at >= PRUNE_INTERVAL:
+            # The newest event of each type stays, so version() never goes back
+            db.execute('''
+                DELETE FROM change_events WHERE created < ?
+                AND id NOT IN (SELECT MAX(id) FROM change_events GROUP BY type)
+            ''', (now - self.retention,))
+            self._pruned_at = now
+        db.execute('INSERT INTO change_events (user_id, type, data, created) VALUES (?, ?, ?, ?)',
+                   (user_id, event_type, json.dumps(data), now))
+
+    def notify(self):
+        self._wake.set()
+
+    def latest_id(self, db):
+        return db.execute('SELECT COALESCE(MAX(id), 0) FROM change_events').fetchone()[0]
+
+    def version(self, db, *event_types):
+        """The id of the last event of any of `event_types` published from any process, or 0."""
+        latest = ', '.join(['COALESCE((SELECT MAX(id) FROM change_events WHERE type = ?), 0)'] * len(event_types))
+        return db.execute(f'SELECT MAX(0, {latest})', event_types).fetchone()[0]
+
+    def subscribe(self, app, last_id, user_id=None, is_parent=False):
+        """Register a stream that wants events after `last_id`; None if this process is at max_streams."""
+        self._poller.ensure_started(app)
+        with self._lock:
+            if len(self._subscribers) >= self.max_streams:
+                return None
+            subscription = Subscription(last_id, user_id, is_parent)
+            self._subscribers.add(subscription)
+        self._wake.set()  # deliver anything after last_id (a reconnect) straight away
+        return subscription
+
+    def stream(self, subscription):
+        """Yield the subscription's events as text/event-stream chunks until the client goes away."""
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            while True:
+                try:
+                    event_id, event_type, data = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    # Keeps proxies from dropping an idle stream and notices clients that left
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'id: {event_id}\nevent: {event_type}\ndata: {data}\n\n'
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {'streams': len(self._subscribers), 'max_streams': self.max_streams}
+
+    def _poll_loop(self, app):
+        pool = app.extensions['db_pool']
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self._lock:
+                subscribers = list(self._subscribers)
+            if not subscribers:
+                continue
+            try:
+                conn = pool.acquire()
+            except sqlite3.Error:
+                logger.exception('Change poller could not get a connection')
+                continue
+            try:
+                rows = conn.execute('SELECT id, user_id, type, data FROM change_events WHERE id > ? ORDER BY id',
+                                    (min(s.last_id for s in subscribers),)).fetchall()
+            except sqlite3.Error:
+                logger.exception('Change poller query failed')
+                continue
+            finally:
+                pool.release(conn)
+            for row in rows:
+                for subscription in subscribers:
+                    if row['id'] > subscription.last_id and subscription.wants(row['type'], row['user_id']):
+                        subscription.queue.put((row['id'], row['type'], row['data']))
+            if rows:
+                for subscription in subscribers:
+                    subscription.last_id = max(subscription.last_id, rows[-1]['id'])
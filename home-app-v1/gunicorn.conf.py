@@ -0,0 +1,34 @@
+# gunicorn -c gunicorn.conf.py wsgi:application
+# Every setting can be overridden from the environment (HOME_APP_*) or the command line.
+import multiprocessing
+import os
+
+bind = os.environ.get('HOME_APP_BIND', '0.0.0.0:5000')
+# SQLite serializes writers, so a few processes with several threads each beats many processes
+workers = int(os.environ.get('HOME_APP_WORKERS', min(4, multiprocessing.cpu_count())))
+threads = int(os.environ.get('HOME_APP_THREADS', 4))  # gthread only
+# gevent (default): requests and idle /events streams are greenlets, so dozens of open dashboards are cheap.
+# gthread: one thread per request, and an open /events stream holds one of them.
+worker_class = os.environ.get('HOME_APP_WORKER_CLASS', 'gevent')
+if worker_class == 'gevent':
+    # Patch now, before on_starting imports the app, so the locks and queues it creates
+    # in the master (and every forked worker inherits) are gevent-aware
+    from gevent import monkey
+    monkey.patch_all()
+    worker_connections = int(os.environ.get('HOME_APP_WORKER_CONNECTIONS', 200))
+else:
+    # Keep half the threads for ordinary requests; app.py reads this when on_starting imports it
+    os.environ.setdefault('HOME_APP_EVENTS_MAX_STREAMS', str(max(1, threads // 2)))
+timeout = 30
+keepalive = 5
+accesslog = os.environ.get('HOME_APP_ACCESS_LOG')  # unset = no access log
+loglevel = os.environ.get('HOME_APP_LOG_LEVEL', 'info').lower()
+
+
+def on_starting(server):
+    # Run migrations once in the master, before workers fork, instead of on every import
+    from app import app, init_db
+    with app.app_context():
+        init_db()
+    # Workers fork from this process: they must open their own connections, not inherit this one
+    app.extensions['db_pool'].close()
@@ -0,0 +1,117 @@
+"""Scheduled database jobs, run from cron through the flask CLI (see app.py).
+
+- materialize_days creates task instances ahead of time, so the first /home
+  visit of the morning only has to read them.
+- archive_task_instances moves old task_instances rows into a separate
+  archive database. daily_stats keeps its rows for those days, so the landing
+  star counts and history charts do not change.
+- backup_database copies a live database with SQLite's online backup API.
+  Readers and writers carry on while it runs.
+"""
+import logging
+import os
+import sqlite3
+
+from db import write_transaction
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BATCH_SIZE = 5000
+BACKUP_PAGES_PER_STEP = 1024
+
+
+def materialize_days(db, dates):
+    """Create every kid's task instances for each date in `dates`. Returns the number of rows added."""
+    added = 0
+    for date in dates:
+        with write_transaction(db):
+            added += db.execute('''
+                INSERT OR IGNORE INTO task_instances (task_template_id, user_id, date)
+                SELECT t.id, u.id, ? FROM users u CROSS JOIN task_templates t
+                WHERE u.type = 'kid' AND t.deleted_at IS NULL
+            ''', (date,)).rowcount
+    return added
+
+
+def archive_task_instances(db, archive_path, before, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move task_instances dated before `before` (YYYY-MM-DD) into the database at `archive_path`.
+
+    Rows move in batches, one write transaction each, so the app can write in
+    between. Returns the number of rows moved.
+    """
+    db.execute('ATTACH DATABASE ? AS archive', (archive_path,))
+    try:
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS archive.task_instances (
+                id INTEGER PRIMARY KEY,
+                task_template_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                done INTEGER NOT NULL,
+                starred INTEGER NOT NULL
+            )
+        ''')
+        # Names for the ids above, in case templates or users are deleted later
+        db.execute('CREATE TABLE IF NOT EXISTS archive.task_templates (id INTEGER PRIMARY KEY, name TEXT, category TEXT)')
+        db.execute('CREATE TABLE IF NOT EXISTS archive.users (id INTEGER PRIMARY KEY, name TEXT)')
+        db.execute('CREATE TEMP TABLE IF NOT EXISTS archive_batch AS SELECT * FROM task_instances WHERE 0')
+        db.commit()
+
+        moved = 0
+        last_id = 0
+        while True:
+            with write_transaction(db):
+                db.execute('DELETE FROM temp.archive_batch')
+                # Walking the rowid keeps each batch cheap without an index on date
+                n = db.execute('''
+                    INSERT INTO temp.archive_batch
+                    SELECT * FROM task_instances WHERE id > ? AND date < ? ORDER BY id LIMIT ?
+                ''', (last_id, before, batch_size)).rowcount
+                if n == 0:
+                    break
+                last_id = db.execute('SELECT MAX(id) FROM temp.archive_batch').fetchone()[0]
+                db.execute('''
+                    INSERT OR REPLACE INTO archive.task_instances (id, task_template_id, user_id, date, done, starred)
+                    SELECT id, task_template_id, user_id, date, done, starred FROM temp.archive_batch
+                ''')
+                db.execute('DELETE FROM task_instances WHERE id IN (SELECT id FROM temp.archive_batch)')
+                # The delete trigger took these rows out of daily_stats; the archived days keep their counts
+                db.execute('''
+                    UPDATE daily_stats SET done_count = done_count + m.done,
+                                           starred_count = starred_count + m.starred
+                    FROM (SELECT user_id, date, SUM(done != 0) AS done, SUM(starred != 0) AS starred
+                          FROM temp.archive_batch GROUP BY user_id, date) AS m
+                    WHERE daily_stats.user_id = m.user_id AND daily_stats.date = m.date
+                ''')
+            moved += n
+            logger.info('Archived %d task instances (%d so far)', n, moved)
+
+        if moved:
+            with write_transaction(db):
+                db.execute('INSERT OR REPLACE INTO archive.task_templates SELECT id, name, category FROM task_templates')
+                db.execute('INSERT OR REPLACE INTO archive.users SELECT id, name FROM users')
+        return moved
+    finally:
+        db.execute('DROP TABLE IF EXISTS temp.archive_batch')
+        db.execute('DETACH DATABASE archive')
+
+
+def backup_database(db, dest_path, pages=BACKUP_PAGES_PER_STEP):
+    """Copy the database behind connection `db` to `dest_path`.
+
+    The copy goes to a temporary file first and is renamed into place when
+    complete, so `dest_path` never holds a half-written backup. The backup
+    copies `pages` pages per step, which lets writers in between steps.
+    The copy is switched out of WAL mode, so it is a single self-contained file.
+    """
+    tmp_path = f'{dest_path}.tmp'
+    dest = sqlite3.connect(tmp_path)
+    try:
+        db.backup(dest, pages=pages)
+        dest.execute('PRAGMA journal_mode = DELETE')
+    except BaseException:
+        dest.close()
+        os.remove(tmp_path)
+        raise
+    dest.close()
+    os.replace(tmp_path, dest_path)
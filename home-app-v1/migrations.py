@@ -0,0 +1,233 @@
+"""Versioned schema migrations.
+
+Each migration is a function registered with @migration(version, description).
+migrate() applies the ones newer than the version recorded in schema_version,
+in order, each inside its own BEGIN IMMEDIATE transaction so that several
+workers starting at once cannot apply the same step twice.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def current_version(db):
+    db.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL, applied_at TEXT NOT NULL)')
+    return db.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
+def migrate(db):
+    """Apply pending migrations and return the list of versions applied."""
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version <= current_version(db):
+            continue
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have applied it while we waited for the lock
+            if version > current_version(db):
+                logger.info('Applying migration %d: %s', version, description)
+                fn(db)
+                db.execute("INSERT INTO schema_version (version, applied_at) VALUES (?, datetime('now'))", (version,))
+                applied.append(version)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    return applied
+
+
+def _columns(db, table):
+    return {row[1] for row in db.execute(f'PRAGMA table_info({table})')}
+
+
+@migration(1, 'create users, task_templates and task_instances')
+def create_base_tables(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,  -- 'parent' or 'kid'
+            passcode TEXT NOT NULL,
+            profile_pic TEXT
+        )
+    ''')
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS task_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            category TEXT NOT NULL,  -- 'morning', 'evening', 'night'
+            order_num INTEGER DEFAULT 0
+        )
+    ''')
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS task_instances (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_template_id INTEGER,
+            user_id INTEGER,
+            date TEXT NOT NULL,  -- YYYY-MM-DD
+            done INTEGER DEFAULT 0,
+            starred INTEGER DEFAULT 0,
+            FOREIGN KEY(task_template_id) REFERENCES task_templates(id) ON DELETE CASCADE,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+
+
+@migration(2, 'add task_templates.order_num')
+def add_order_num(db):
+    # Databases created before ordering existed lack the column
+    if 'order_num' not in _columns(db, 'task_templates'):
+        db.execute('ALTER TABLE task_templates ADD COLUMN order_num INTEGER DEFAULT 0')
+
+
+@migration(3, 'unique index on task_instances (user_id, date, task_template_id)')
+def unique_instance_index(db):
+    # Drop duplicates left by racing requests, keeping the oldest row since that
+    # is the one the page has always shown.
+    db.execute('''
+        DELETE FROM task_instances WHERE id NOT IN (
+            SELECT MIN(id) FROM task_instances GROUP BY user_id, date, task_template_id
+        )
+    ''')
+    # Superseded by the user-first index, which also serves per-kid date lookups
+    db.execute('DROP INDEX IF EXISTS idx_task_instances_template_user_date')
+    db.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_task_instances_user_date_template
+        ON task_instances (user_id, date, task_template_id)
+    ''')
+
+
+@migration(4, 'partial index on starred task_instances (user_id, date)')
+def starred_index(db):
+    db.execute('''
+        CREATE INDEX IF NOT EXISTS idx_task_instances_starred
+        ON task_instances (user_id, date) WHERE starred = 1
+    ''')
+
+
+@migration(5, 'daily_stats rollup maintained by triggers on task_instances')
+def daily_stats(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,  -- YYYY-MM-DD
+            done_count INTEGER NOT NULL DEFAULT 0,
+            starred_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, date),
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    ''')
+    # Every write to task_instances (home() actions, cascades from deleted users
+    # or templates) adjusts the matching rollup row in the same transaction.
+    db.execute('''
+        CREATE TRIGGER IF NOT EXISTS daily_stats_insert AFTER INSERT ON task_instances
+        WHEN NEW.done != 0 OR NEW.starred != 0
+        BEGIN
+            INSERT INTO daily_stats (user_id, date, done_count, starred_count)
+            VALUES (NEW.user_id, NEW.date, NEW.done != 0, NEW.starred != 0)
+            ON CONFLICT (user_id, date) DO UPDATE SET
+                done_count = done_count + excluded.done_count,
+                starred_count = starred_count + excluded.starred_count;
+        END
+    ''')
+    db.execute('''
+        CREATE TRIGGER IF NOT EXISTS daily_stats_update AFTER UPDATE OF done, starred, user_id, date ON task_instances
+        WHEN (OLD.done != 0) != (NEW.done != 0) OR (OLD.starred != 0) != (NEW.starred != 0)
+             OR OLD.user_id IS NOT NEW.user_id OR OLD.date != NEW.date
+        BEGIN
+            UPDATE daily_stats SET done_count = done_count - (OLD.done != 0),
+                                   starred_count = starred_count - (OLD.starred != 0)
+            WHERE user_id = OLD.user_id AND date = OLD.date;
+            INSERT INTO daily_stats (user_id, date, done_count, starred_count)
+            VALUES (NEW.user_id, NEW.date, NEW.done != 0, NEW.starred != 0)
+            ON CONFLICT (user_id, date) DO UPDATE SET
+                done_count = done_count + excluded.done_count,
+                starred_count = starred_count + excluded.starred_count;
+        END
+    ''')
+    db.execute('''
+        CREATE TRIGGER IF NOT EXISTS daily_stats_delete AFTER DELETE ON task_instances
+        WHEN OLD.done != 0 OR OLD.starred != 0
+        BEGIN
+            UPDATE daily_stats SET done_count = done_count - (OLD.done != 0),
+                                   starred_count = starred_count - (OLD.starred != 0)
+            WHERE user_id = OLD.user_id AND date = OLD.date;
+        END
+    ''')
+    backfill_daily_stats(db)
+
+
+def backfill_daily_stats(db):
+    """Rebuild daily_stats from task_instances. Runs inside the caller's transaction.
+
+    Days before the oldest task instance keep their rows: those instances have
+    been archived (see maintenance.py) and the rollup is all that is left.
+    """
+    db.execute('DELETE FROM daily_stats WHERE date >= (SELECT MIN(date) FROM task_instances)')
+    db.execute('''
+        INSERT INTO daily_stats (user_id, date, done_count, starred_count)
+        SELECT user_id, date, SUM(done != 0), SUM(starred != 0)
+        FROM task_instances
+        WHERE user_id IN (SELECT id FROM users)
+        GROUP BY user_id, date
+        HAVING SUM(done != 0) > 0 OR SUM(starred != 0) > 0
+    ''')
+
+
+@migration(6, 'sessions table for the SQLite session backend')
+def sessions_table(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expiry INTEGER NOT NULL  -- unix time
+        ) WITHOUT ROWID
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expiry ON sessions (expiry)')
+
+
+@migration(7, 'change_events table feeding the /events live updates')
+def change_events_table(db):
+    # AUTOINCREMENT so ids never go backwards once old rows are pruned; streams resume by id
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS change_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            data TEXT NOT NULL,  -- JSON
+            created INTEGER NOT NULL  -- unix time
+        )
+    ''')
+
+
+@migration(8, 'add task_templates.deleted_at')
+def template_deleted_at(db):
+    # Deleted tasks are hidden rather than removed, so their task_instances
+    # (and the stars counted from them) survive
+    if 'deleted_at' not in _columns(db, 'task_templates'):
+        db.execute('ALTER TABLE task_templates ADD COLUMN deleted_at TEXT')
+
+
+@migration(9, 'index on change_events (type) for the cache versions')
+def change_events_type_index(db):
+    db.execute('CREATE INDEX IF NOT EXISTS idx_change_events_type ON change_events (type)')
+
+
+def table_scans(db, sql, params=(), tables=('task_instances', 'daily_stats')):
+    """Return the EXPLAIN QUERY PLAN lines that walk a whole table (or index) in `tables`."""
+    scans = []
+    for row in db.execute(f'EXPLAIN QUERY PLAN {sql}', params):
+        words = row['detail'].split()
+        if len(words) >= 2 and words[0] == 'SCAN' and words[1] in tables:
+            scans.append(row['detail'])
+    return scans
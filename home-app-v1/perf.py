@@ -0,0 +1,216 @@
+"""Opt-in request profiling (HOME_APP_PERF=1).
+
+When enabled, every request gets:
+- a timer, plus counts of the SQL statements and commits it ran and the time
+  spent in SQLite. This works by wrapping the connection get_db() returns.
+- a Server-Timing response header with those numbers.
+- a sample in a rolling per-endpoint window. /debug/perf reports
+  p50/p95/p99 from that window.
+- a warning when one SQL statement runs PERF_N_PLUS_ONE or more times in a
+  single request, which is the signature of a query inside a loop (N+1).
+- optionally, a cProfile dump. A PERF_PROFILE_SAMPLE fraction of requests
+  is profiled, and a dump is kept when the request took longer than
+  PERF_PROFILE_THRESHOLD_MS.
+
+Session writes happen after the after_request hooks have run, so the numbers
+do not include them.
+"""
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.commits = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+
+
+def _request_stats():
+    if 'perf' not in g:
+        g.perf = RequestStats()
+    return g.perf
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._stats.db_time += time.perf_counter() - start
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall)
+
+    def fetchmany(self, *args):
+        return self._timed(self._cursor.fetchmany, *args)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Wraps a sqlite3 connection, timing and counting what runs through it."""
+
+    def __init__(self, conn, stats):
+        self.raw = conn
+        self._stats = stats
+
+    def _run(self, method, sql, *args):
+        self._stats.queries += 1
+        self._stats.statements[sql] += 1
+        start = time.perf_counter()
+        try:
+            return InstrumentedCursor(getattr(self.raw, method)(sql, *args), self._stats)
+        finally:
+            self._stats.db_time += time.perf_counter() - start
+
+    def execute(self, sql, *args):
+        return self._run('execute', sql, *args)
+
+    def executemany(self, sql, *args):
+        return self._run('executemany', sql, *args)
+
+    def commit(self):
+        self._stats.commits += 1
+        start = time.perf_counter()
+        try:
+            self.raw.commit()
+        finally:
+            self._stats.db_time += time.perf_counter() - start
+
+    def __enter__(self):
+        self.raw.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None and self.raw.in_transaction:
+            self._stats.commits += 1
+        return self.raw.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class PerfMonitor:
+    def __init__(self, window=1000, n_plus_one=10, profile_sample=0.0, profile_threshold_ms=500, profile_dir=None):
+        self.window = window
+        self.n_plus_one = n_plus_one
+        self.profile_sample = profile_sample
+        self.profile_threshold_ms = profile_threshold_ms
+        self.profile_dir = profile_dir
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._suspects = {}  # (endpoint, sql) -> highest repeat count seen
+        # cProfile can only run one profiler at a time on Python 3.12+
+        self._profile_lock = threading.Lock()
+
+    def wrap(self, conn):
+        return InstrumentedConnection(conn, _request_stats())
+
+    def before_request(self):
+        _request_stats()
+        g.perf_profiler = None
+        if self.profile_sample and random.random() < self.profile_sample and self._profile_lock.acquire(blocking=False):
+            g.perf_profiler = cProfile.Profile()
+            g.perf_profiler.enable()
+        g.perf_start = time.perf_counter()
+
+    def after_request(self, response):
+        if 'perf_start' not in g:
+            return response
+        elapsed_ms = (time.perf_counter() - g.perf_start) * 1000
+        stats = _request_stats()
+        endpoint = request.endpoint or 'unknown'
+        self._finish_profile(endpoint, elapsed_ms)
+
+        repeated = [(sql, n) for sql, n in stats.statements.items() if n >= self.n_plus_one]
+        for sql, n in repeated:
+            logger.warning('Possible N+1 in %s: %d x %s', endpoint, n, ' '.join(sql.split()))
+        with self._lock:
+            self._samples[endpoint].append((elapsed_ms, stats.queries, stats.db_time * 1000))
+            for sql, n in repeated:
+                key = (endpoint, ' '.join(sql.split()))
+                self._suspects[key] = max(n, self._suspects.get(key, 0))
+
+        response.headers.add('Server-Timing', f'app;dur={elapsed_ms:.1f}')
+        response.headers.add('Server-Timing', f'db;dur={stats.db_time * 1000:.1f};'
+                                              f'desc="{stats.queries} queries, {stats.commits} commits"')
+        return response
+
+    def _finish_profile(self, endpoint, elapsed_ms):
+        profiler = g.pop('perf_profiler', None)
+        if profiler is None:
+            return
+        try:
+            profiler.disable()
+            if elapsed_ms >= self.profile_threshold_ms and self.profile_dir:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                path = os.path.join(self.profile_dir, f'{endpoint}-{int(time.time())}-{elapsed_ms:.0f}ms.prof')
+                profiler.dump_stats(path)
+                logger.info('Slow request %s (%.0f ms) profiled to %s', endpoint, elapsed_ms, path)
+        finally:
+            self._profile_lock.release()
+
+    def report(self):
+        """Per-endpoint latency percentiles and query counts over the rolling window."""
+        with self._lock:
+            samples = {endpoint: list(window) for endpoint, window in self._samples.items()}
+            suspects = [{'endpoint': endpoint, 'sql': sql, 'count': n}
+                        for (endpoint, sql), n in sorted(self._suspects.items(), key=lambda item: -item[1])]
+        rows = []
+        for endpoint, window in sorted(samples.items()):
+            durations = sorted(s[0] for s in window)
+            rows.append({
+                'endpoint': endpoint,
+                'count': len(window),
+                'p50_ms': round(_percentile(durations, 50), 2),
+                'p95_ms': round(_percentile(durations, 95), 2),
+                'p99_ms': round(_percentile(durations, 99), 2),
+                'avg_queries': round(sum(s[1] for s in window) / len(window), 1),
+                'avg_db_ms': round(sum(s[2] for s in window) / len(window), 2),
+            })
+        return {'endpoints': rows, 'n_plus_one': suspects}
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def init_app(app):
+    monitor = PerfMonitor(
+        window=app.config['PERF_WINDOW'],
+        n_plus_one=app.config['PERF_N_PLUS_ONE'],
+        profile_sample=app.config['PERF_PROFILE_SAMPLE'],
+        profile_threshold_ms=app.config['PERF_PROFILE_THRESHOLD_MS'],
+        profile_dir=app.config['PERF_PROFILE_DIR'],
+    )
+    app.extensions['perf'] = monitor
+    app.extensions['db_wrap'] = monitor.wrap
+    app.before_request(monitor.before_request)
+    app.after_request(monitor.after_request)
+    return monitor
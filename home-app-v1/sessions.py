@@ -0,0 +1,101 @@
+"""Server-side sessions stored in the app's SQLite database.
+
+The cookie only carries a random session id. A request that leaves the
+session untouched does not write to the database, except to push the expiry
+forward once less than half of PERMANENT_SESSION_LIFETIME remains. Expired
+rows are deleted by a daemon thread in each process.
+"""
+import logging
+import secrets
+import sqlite3
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+
+from db import BackgroundThread, get_db
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteSession(SecureCookieSession):
+    def __init__(self, initial=None, sid=None, expiry=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.expiry = expiry
+
+
+class SQLiteSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, prune_interval=600):
+        self.prune_interval = prune_interval
+        self._pruner = BackgroundThread(self._prune_loop, 'session-pruner')
+
+    def open_session(self, app, request):
+        self._pruner.ensure_started(app)
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            row = get_db().execute('SELECT data, expiry FROM sessions WHERE id = ? AND expiry > ?',
+                                   (sid, int(time.time()))).fetchone()
+            if row is not None:
+                return SQLiteSession(self.serializer.loads(row['data']), sid=sid, expiry=row['expiry'])
+        return SQLiteSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and session.sid:
+                db = get_db()
+                db.execute('DELETE FROM sessions WHERE id = ?', (session.sid,))
+                db.commit()
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app), httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        now = int(time.time())
+        lifetime = int(app.permanent_session_lifetime.total_seconds())
+        is_new = session.sid is None
+        stale = session.expiry is None or session.expiry - now < lifetime // 2
+        if not (session.modified or is_new or stale):
+            return
+
+        if is_new:
+            session.sid = secrets.token_urlsafe(32)
+        session.expiry = now + lifetime
+        db = get_db()
+        db.execute('''
+            INSERT INTO sessions (id, data, expiry) VALUES (?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET data = excluded.data, expiry = excluded.expiry
+        ''', (session.sid, self.serializer.dumps(dict(session)), session.expiry))
+        db.commit()
+
+        if is_new or session.permanent:
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                                domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                httponly=self.get_cookie_httponly(app), samesite=self.get_cookie_samesite(app))
+
+    def _prune_loop(self, app):
+        pool = app.extensions['db_pool']
+        while True:
+            time.sleep(self.prune_interval)
+            try:
+                conn = pool.acquire()
+            except sqlite3.Error:
+                logger.exception('Session pruning could not get a connection')
+                continue
+            try:
+                deleted = conn.execute('DELETE FROM sessions WHERE expiry <= ?', (int(time.time()),)).rowcount
+                conn.commit()
+                if deleted:
+                    logger.info('Pruned %d expired sessions', deleted)
+            except sqlite3.Error:
+                logger.exception('Session pruning failed')
+            finally:
+                pool.release(conn)
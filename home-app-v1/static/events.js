@@ -0,0 +1,25 @@
+// Subscribe to live changes pushed from /events (server-sent events).
+// `handlers` maps an event type ('instances', 'stars') to a function taking its data.
+// EventSource reconnects by itself after a dropped connection and resumes from the
+// last event it saw. If the server refuses the stream (it is at its connection limit),
+// try again later.
+window.listenForChanges = function (handlers) {
+    if (!window.EventSource) {
+        return;
+    }
+    const REFUSED_RETRY_MS = 60000;
+
+    function connect() {
+        const source = new EventSource('/events');
+        Object.entries(handlers).forEach(([type, handler]) => {
+            source.addEventListener(type, event => handler(JSON.parse(event.data)));
+        });
+        source.addEventListener('error', () => {
+            if (source.readyState === EventSource.CLOSED) {
+                setTimeout(connect, REFUSED_RETRY_MS);
+            }
+        });
+    }
+
+    connect();
+};
@@ -0,0 +1,89 @@
+// Update task buttons in place through the JSON API instead of posting the form
+// and reloading the page. Taps made in quick succession go out as one batch.
+// Changes made elsewhere arrive through events.js and are applied the same way.
+// Without JavaScript the forms still post to /home as before.
+(function () {
+    const BATCH_DELAY_MS = 300;
+    const CLASSES = {
+        done: ['btn-success', 'btn-outline-secondary'],
+        starred: ['btn-warning', 'btn-outline-warning'],
+    };
+    const pending = new Map();
+    let timer = null;
+
+    function elementsFor(id, field) {
+        return document.querySelectorAll(`[data-instance-id="${id}"][data-field="${field}"]`);
+    }
+
+    function render(id, field, value) {
+        const [on, off] = CLASSES[field];
+        elementsFor(id, field).forEach(el => {
+            el.dataset.value = value ? 'true' : 'false';
+            const target = el.tagName === 'FORM' ? el.querySelector('button') : el;
+            target.classList.toggle(on, value);
+            target.classList.toggle(off, !value);
+            if (field === 'done') {
+                target.textContent = value ? 'Done' : 'Undone';
+            }
+        });
+    }
+
+    function queue(id, field, value) {
+        render(id, field, value);
+        const change = pending.get(id) || { id: id };
+        change[field] = value;
+        pending.set(id, change);
+        clearTimeout(timer);
+        timer = setTimeout(flush, BATCH_DELAY_MS);
+    }
+
+    function flush() {
+        const changes = Array.from(pending.values());
+        pending.clear();
+        if (!changes.length) {
+            return;
+        }
+        fetch('/api/instances', {
+            method: 'PATCH',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ changes: changes }),
+            keepalive: true,
+        })
+            .then(response => (response.ok ? response.json() : Promise.reject(response)))
+            .then(data => data.instances.forEach(row => {
+                render(row.id, 'done', row.done);
+                render(row.id, 'starred', row.starred);
+            }))
+            // The server refused or is unreachable: show what it actually has
+            .catch(() => window.location.reload());
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('form[data-field]').forEach(form => {
+            form.addEventListener('submit', event => {
+                event.preventDefault();
+                queue(Number(form.dataset.instanceId), form.dataset.field, form.dataset.value !== 'true');
+            });
+        });
+        const starAll = document.getElementById('starAllForm');
+        if (starAll) {
+            starAll.addEventListener('submit', event => {
+                event.preventDefault();
+                document.querySelectorAll('form[data-field="done"][data-value="true"]').forEach(form => {
+                    queue(Number(form.dataset.instanceId), 'starred', true);
+                });
+                flush();
+            });
+        }
+        window.addEventListener('pagehide', flush);
+        // Changes made on another device; leave alone any task with taps still queued here
+        window.listenForChanges({
+            instances: data => data.instances.forEach(row => {
+                if (!pending.has(row.id)) {
+                    render(row.id, 'done', row.done);
+                    render(row.id, 'starred', row.starred);
+                }
+            }),
+        });
+    });
+})();
@@ -0,0 +1,9 @@
+"""WSGI entry point for production servers.
+
+    flask --app app init-db          # once per deploy: create/upgrade the schema
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Importing this module does not touch the database; gunicorn.conf.py runs the
+schema setup once in the master process before any worker starts.
+"""
+from app import app as application